@@ -1,53 +1,82 @@
 from __future__ import annotations
 
+import re
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional
 
 # Simple, transparent categorization rules for v1:
 # - Deterministic and easy to adjust later.
 # - Based on common command prefixes / keywords.
 
-TEST_PREFIXES = {"pytest", "nosetests", "tox", "npm", "pnpm", "yarn", "mvn", "gradle", "dotnet", "go", "cargo"}
-BUILD_KEYWORDS = {"build", "compile", "package", "bundle"}
-TEST_KEYWORDS = {"test", "tests"}
-LINT_KEYWORDS = {"lint", "format", "fmt", "ruff", "flake8", "black", "prettier", "eslint"}
-GIT_PREFIXES = {"git"}
-DOCKER_PREFIXES = {"docker", "podman"}
+TEST_PREFIXES = frozenset({"pytest", "nosetests", "tox", "npm", "pnpm", "yarn", "mvn", "gradle", "dotnet", "go", "cargo"})
+BUILD_KEYWORDS = frozenset({"build", "compile", "package", "bundle"})
+TEST_KEYWORDS = frozenset({"test", "tests"})
+LINT_KEYWORDS = frozenset({"lint", "format", "fmt", "ruff", "flake8", "black", "prettier", "eslint"})
+GIT_PREFIXES = frozenset({"git"})
+DOCKER_PREFIXES = frozenset({"docker", "podman"})
 
+# Tools whose subcommand decides the category
+_NODE_TOOLS = frozenset({"npm", "pnpm", "yarn"})
+_JVM_DOTNET_TOOLS = frozenset({"mvn", "gradle", "dotnet"})
+_PY_TEST_TOOLS = frozenset({"pytest", "tox", "nosetests"})
+# Node script names are matched by prefix so `test:unit`, `lint:fix` and
+# `build:prod` count like their bare forms.
+_LINT_STARTS = tuple(LINT_KEYWORDS)
+_BUILD_STARTS = tuple(BUILD_KEYWORDS)
+
+
+def _substring_re(keywords: frozenset[str]) -> re.Pattern:
+    # Other commands match keywords anywhere (`python -m pytest`, `make check-format`,
+    # `gradle :app:test`); one alternation per set is a single C-level scan.
+    return re.compile("|".join(re.escape(k) for k in sorted(keywords)))
+
+
+_TEST_RE = _substring_re(TEST_KEYWORDS)
+_LINT_RE = _substring_re(LINT_KEYWORDS)
+_BUILD_RE = _substring_re(BUILD_KEYWORDS)
+
+# First tokens that decide the category on their own
+_FIRST_TOKEN_CATEGORY: dict[str, str] = {
+    **{p: "git" for p in GIT_PREFIXES},
+    **{p: "container" for p in DOCKER_PREFIXES},
+    **{p: "testing" for p in _PY_TEST_TOOLS},
+}
+
+@lru_cache(maxsize=4096)
 def categorize(command_str: str) -> str:
     """Return a broad category label for a command string."""
-    if not command_str:
+    head = command_str.split(maxsplit=1)
+    if not head:
         return "other"
-    first = command_str.split()[0].strip("'"")
-    low = command_str.lower()
+    # Matched case-sensitively: `Git status` is not a git command.
+    first = head[0].strip("'\"")
+
+    direct = _FIRST_TOKEN_CATEGORY.get(first)
+    if direct:
+        return direct
 
-    if first in GIT_PREFIXES:
-        return "git"
-    if first in DOCKER_PREFIXES:
-        return "container"
+    low = command_str.lower()
 
     # Testing/build tools often share a single entrypoint
-    if first in {"npm", "pnpm", "yarn"}:
-        if " test" in low or low.endswith(" test"):
+    if first in _NODE_TOOLS:
+        rest = low.split()[1:]
+        if any(t.startswith("test") for t in rest):
             return "testing"
-        if any(f" {k}" in low for k in LINT_KEYWORDS):
+        if any(t.startswith(_LINT_STARTS) for t in rest):
             return "lint"
-        if any(f" {k}" in low for k in BUILD_KEYWORDS):
+        if any(t.startswith(_BUILD_STARTS) for t in rest):
             return "build"
         return "node"
-    if first in {"mvn", "gradle", "dotnet"}:
-        if any(k in low for k in TEST_KEYWORDS):
+    if first in _JVM_DOTNET_TOOLS:
+        if _TEST_RE.search(low):
             return "testing"
-        if any(k in low for k in BUILD_KEYWORDS):
-            return "build"
         return "build"
-    if first in {"pytest", "tox", "nosetests"}:
-        return "testing"
-    if any(k in low for k in LINT_KEYWORDS):
+    if _LINT_RE.search(low):
         return "lint"
-    if any(k in low for k in TEST_KEYWORDS):
+    if _TEST_RE.search(low):
         return "testing"
-    if any(k in low for k in BUILD_KEYWORDS):
+    if _BUILD_RE.search(low):
         return "build"
 
     return "other"
@@ -1,50 +1,48 @@
 from __future__ import annotations
 
 import argparse
-import csv
-import json
 import os
-import subprocess
 import sys
 from datetime import datetime, timedelta, timezone
-from pathlib import Path
-
-from .categorize import categorize
-from .config import load_config, save_config, config_path
-from .db import (
-    resolve_db_path,
-    connect,
-    init_db,
-    insert_run,
-    fetch_runs_between,
-    fetch_recent_runs,
-    get_active_session_id,
-    set_active_session_id,
-    create_session,
-    end_session,
-    fetch_sessions,
-)
-from .report import build_report, render_report_text, local_day_bounds, to_utc
+from functools import lru_cache
+
 from .utils import sanitize_command, format_duration
 
+# Modules only some subcommands need (csv, json, subprocess, config, report, db,
+# categorize) are imported inside those handlers, so `--version`, `--help` and
+# `init` never load sqlite3, and `timetrace record` (run on every shell prompt)
+# loads only what it uses.
 
-def _parser() -> argparse.ArgumentParser:
-    p = argparse.ArgumentParser(
-        prog="timetrace",
-        description="Track command durations and generate local-first time reports.",
-    )
-    p.add_argument("--db", default=None, help="Path to the SQLite DB file (default: OS data directory).")
-    p.add_argument("--version", action="store_true", help="Print version and exit.")
 
-    sub = p.add_subparsers(dest="cmd", required=False)
+def _json_encoder():
+    """Return a callable encoding one object to UTF-8 JSON bytes."""
+    try:  # optional: pip install timetrace[fast]
+        import orjson
+    except ImportError:
+        import json
 
-    pr = sub.add_parser("run", help="Track a single command execution (manual wrapper).")
+        # Compact separators and raw UTF-8 match orjson's output byte for byte.
+        return lambda obj: json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return orjson.dumps
+
+
+# Resolved once per process; every local-time computation below reuses it.
+_LOCAL_TZ = datetime.now(timezone.utc).astimezone().tzinfo
+
+
+def _add_run_parser(sub) -> None:
+    # The command after `--` is split off in main() before argparse sees argv.
+    pr = sub.add_parser(
+        "run",
+        help="Track a single command execution (manual wrapper).",
+        usage="%(prog)s [--tag TAG] [--project PROJECT] [--cwd CWD] -- <command...>",
+    )
     pr.add_argument("--tag", default=None, help="Optional tag to attach to this run (e.g., 'course', 'client').")
     pr.add_argument("--project", default=None, help="Optional project name override for grouping in reports.")
     pr.add_argument("--cwd", default=None, help="Working directory to run the command in (default: current dir).")
-    pr.add_argument("double_dash", nargs="?", help="Use `--` before the command, e.g. timetrace run -- npm test")
-    pr.add_argument("command", nargs=argparse.REMAINDER, help="Command to execute (must follow --).")
 
+
+def _add_record_parser(sub) -> None:
     prec = sub.add_parser("record", help="Record a run without executing it (used by shell hooks).")
     prec.add_argument("--started", required=True, help="Start time (ISO 8601, local or UTC).")
     prec.add_argument("--finished", required=True, help="Finish time (ISO 8601, local or UTC).")
@@ -53,7 +51,14 @@ def _parser() -> argparse.ArgumentParser:
     prec.add_argument("--command", required=True, help="Command string.")
     prec.add_argument("--tag", default=None, help="Optional tag.")
     prec.add_argument("--project", default=None, help="Optional project override.")
+    prec.add_argument(
+        "--defer",
+        action="store_true",
+        help="Append to the pending spool instead of the DB (also enabled by TIMETRACE_DEFER=1).",
+    )
 
+
+def _add_report_parser(sub) -> None:
     prp = sub.add_parser("report", help="Generate a report for a time window.")
     g = prp.add_mutually_exclusive_group()
     g.add_argument("--today", action="store_true", help="Report for today (local time).")
@@ -65,9 +70,14 @@ def _parser() -> argparse.ArgumentParser:
     prp.add_argument("--session", type=int, default=None, help="Filter to a session id.")
     prp.add_argument("--limit", type=int, default=10000, help="Max runs to include.")
 
+
+def _add_list_parser(sub) -> None:
     pl = sub.add_parser("list", help="List recent tracked runs.")
     pl.add_argument("--limit", type=int, default=20, help="Number of runs to show.")
+    pl.add_argument("--before", type=int, default=None, metavar="ID", help="Only show runs that started before run #ID.")
 
+
+def _add_export_parser(sub) -> None:
     pe = sub.add_parser("export", help="Export runs for a time window.")
     pe.add_argument("--format", choices=["json", "csv"], default="json", help="Export format.")
     pe.add_argument("--out", default=None, help="Output file path (default: stdout).")
@@ -81,6 +91,8 @@ def _parser() -> argparse.ArgumentParser:
     pe.add_argument("--session", type=int, default=None, help="Filter to a session id.")
     pe.add_argument("--limit", type=int, default=100000, help="Max runs to include.")
 
+
+def _add_session_parser(sub) -> None:
     ps = sub.add_parser("session", help="Manage focused work sessions.")
     ss = ps.add_subparsers(dest="session_cmd", required=True)
     sstart = ss.add_parser("start", help="Start a session and make it active.")
@@ -90,6 +102,8 @@ def _parser() -> argparse.ArgumentParser:
     slist = ss.add_parser("list", help="List recent sessions.")
     slist.add_argument("--limit", type=int, default=20, help="Number of sessions to show.")
 
+
+def _add_ignore_parser(sub) -> None:
     pi = sub.add_parser("ignore", help="Manage ignore rules for auto-tracking.")
     isi = pi.add_subparsers(dest="ignore_cmd", required=True)
     isi.add_parser("list", help="Show ignore rules.")
@@ -102,20 +116,103 @@ def _parser() -> argparse.ArgumentParser:
     irmr = isi.add_parser("remove-regex", help="Remove an ignored regex.")
     irmr.add_argument("pattern")
 
+
+def _add_init_parser(sub) -> None:
     pin = sub.add_parser("init", help="Print shell hook code for auto-tracking.")
     pin.add_argument("shell", choices=["bash", "zsh", "powershell"], help="Shell type.")
 
+
+def _add_status_parser(sub) -> None:
     sub.add_parser("status", help="Show timetrace paths and current configuration info.")
 
+
+_SUBPARSER_BUILDERS = {
+    "run": _add_run_parser,
+    "record": _add_record_parser,
+    "report": _add_report_parser,
+    "list": _add_list_parser,
+    "export": _add_export_parser,
+    "session": _add_session_parser,
+    "ignore": _add_ignore_parser,
+    "init": _add_init_parser,
+    "status": _add_status_parser,
+}
+
+_PARSERS: dict[str | None, argparse.ArgumentParser] = {}
+
+
+def _parser(cmd: str | None = None) -> argparse.ArgumentParser:
+    """Return a parser with only `cmd`'s subparser, or all of them if `cmd` is unknown.
+
+    parse_args() does not mutate the parser, so each variant is built once per process.
+    """
+    key = cmd if cmd in _SUBPARSER_BUILDERS else None
+    p = _PARSERS.get(key)
+    if p is None:
+        p = _PARSERS[key] = _build_parser(key)
     return p
 
 
+def _build_parser(cmd: str | None = None) -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(
+        prog="timetrace",
+        description="Track command durations and generate local-first time reports.",
+    )
+    p.add_argument("--db", default=None, help="Path to the SQLite DB file (default: OS data directory).")
+    p.add_argument("--version", action="store_true", help="Print version and exit.")
+
+    sub = p.add_subparsers(dest="cmd", required=False)
+    if cmd is not None:
+        _SUBPARSER_BUILDERS[cmd](sub)
+    else:
+        for build in _SUBPARSER_BUILDERS.values():
+            build(sub)
+    return p
+
+
+def _subcommand_index(argv: list[str]) -> int | None:
+    """Index of the subcommand token in argv, skipping the global options."""
+    i = 0
+    while i < len(argv):
+        tok = argv[i]
+        if tok == "--db":
+            i += 2
+            continue
+        if tok.startswith("--db=") or tok == "--version":
+            i += 1
+            continue
+        return i if tok in _SUBPARSER_BUILDERS else None
+    return None
+
+
+def _sniff_subcommand(argv: list[str]) -> str | None:
+    i = _subcommand_index(argv)
+    return argv[i] if i is not None else None
+
+
 def main(argv: list[str] | None = None) -> int:
     from . import __version__
 
     argv = argv if argv is not None else sys.argv[1:]
-    p = _parser()
-    args = p.parse_args(argv)
+    if argv and argv[0] == "record":
+        fast_args = _fast_record_args(argv[1:])
+        if fast_args is not None:
+            return _cmd_record(fast_args, explicit_db=None)
+    if argv and argv[0] == "run":
+        fast_args = _fast_run_args(argv[1:])
+        if fast_args is not None:
+            return _cmd_run(fast_args, explicit_db=None)
+
+    argv, run_command = _split_run_command(argv)
+    p = _parser(_sniff_subcommand(argv))
+    args, extras = p.parse_known_args(argv)
+    if extras:
+        if args.cmd == "run":
+            print("Error: Put the command after `--`, e.g. timetrace run -- npm test", file=sys.stderr)
+            return 2
+        p.error(f"unrecognized arguments: {' '.join(extras)}")
+    if args.cmd == "run":
+        args.command = run_command
 
     if args.version:
         print(__version__)
@@ -132,22 +229,20 @@ def main(argv: list[str] | None = None) -> int:
     if args.cmd == "status":
         return _cmd_status(args)
 
-    paths = resolve_db_path(args.db)
-    conn = connect(paths.db_path)
-    init_db(conn)
+    if args.cmd == "record":
+        return _cmd_record(args, explicit_db=args.db)
 
+    # Each handler opens the database itself, only once it knows it needs it.
     if args.cmd == "run":
-        return _cmd_run(conn, args, explicit_db=args.db)
-    if args.cmd == "record":
-        return _cmd_record(conn, args, explicit_db=args.db)
+        return _cmd_run(args, explicit_db=args.db)
     if args.cmd == "report":
-        return _cmd_report(conn, args)
+        return _cmd_report(args)
     if args.cmd == "list":
-        return _cmd_list(conn, args)
+        return _cmd_list(args)
     if args.cmd == "export":
-        return _cmd_export(conn, args)
+        return _cmd_export(args)
     if args.cmd == "session":
-        return _cmd_session(conn, args)
+        return _cmd_session(args)
     if args.cmd == "ignore":
         return _cmd_ignore(args, explicit_db=args.db)
 
@@ -155,7 +250,110 @@ def main(argv: list[str] | None = None) -> int:
     return 2
 
 
+def _split_run_command(argv: list[str]) -> tuple[list[str], list[str]]:
+    """Split `[... run [opts]] -- <command...>` into (timetrace args, command).
+
+    Everything after the first `--` following the `run` subcommand is the command,
+    verbatim. Other argv shapes are returned unchanged with an empty command.
+    """
+    i = _subcommand_index(argv)
+    if i is None or argv[i] != "run":
+        return argv, []
+    try:
+        sep = argv.index("--", i + 1)
+    except ValueError:
+        return argv, []
+    return argv[:sep], argv[sep + 1 :]
+
+
+_RECORD_FLAGS = {
+    "--started": "started",
+    "--finished": "finished",
+    "--exit": "exit",
+    "--cwd": "cwd",
+    "--command": "command",
+    "--tag": "tag",
+    "--project": "project",
+}
+_RECORD_REQUIRED = ("started", "finished", "exit", "cwd", "command")
+
+
+def _fast_record_args(argv: list[str]) -> argparse.Namespace | None:
+    """Parse `record` flags without argparse (shell hooks call this per prompt).
+
+    Returns None for anything unusual so the caller can fall back to the full
+    parser and its error reporting.
+    """
+    values: dict[str, object] = {"tag": None, "project": None, "defer": False}
+    i = 0
+    while i < len(argv):
+        if argv[i] == "--defer":
+            values["defer"] = True
+            i += 1
+            continue
+        dest = _RECORD_FLAGS.get(argv[i])
+        if dest is None or i + 1 >= len(argv):
+            return None
+        values[dest] = argv[i + 1]
+        i += 2
+    if any(k not in values for k in _RECORD_REQUIRED):
+        return None
+    try:
+        values["exit"] = int(values["exit"])
+    except ValueError:
+        return None
+    return argparse.Namespace(db=None, version=False, cmd="record", **values)
+
+
+_RUN_FLAGS = {"--tag": "tag", "--project": "project", "--cwd": "cwd"}
+
+
+def _fast_run_args(argv: list[str]) -> argparse.Namespace | None:
+    """Parse `run [opts] -- <command...>` without building the argparse parser.
+
+    Same contract as `_fast_record_args`: None means "use the full parser".
+    """
+    try:
+        sep = argv.index("--")
+    except ValueError:
+        return None
+    if sep + 1 >= len(argv):
+        return None
+    values: dict[str, object] = {"tag": None, "project": None, "cwd": None}
+    i = 0
+    while i < sep:
+        dest = _RUN_FLAGS.get(argv[i])
+        if dest is None or i + 1 >= sep:
+            return None
+        values[dest] = argv[i + 1]
+        i += 2
+    return argparse.Namespace(db=None, version=False, cmd="run", command=argv[sep + 1 :], **values)
+
+
+def _open_db(explicit_db: str | None, *, create: bool = True, drain: bool = True):
+    """Open (and migrate) the database, replaying any deferred runs.
+
+    With create=False, return None instead of creating a database when neither
+    the file nor a pending spool exists yet. With drain=False the spool is left
+    for the caller to replay (see `_cmd_run`).
+    """
+    from .db import connect, init_db, drain_spool
+    from .spool import resolve_db_path, spool_path
+
+    paths = resolve_db_path(explicit_db)
+    if not create and not paths.db_path.exists() and not spool_path(paths.db_path).exists():
+        return None
+    conn = connect(paths.db_path)
+    init_db(conn)
+    if drain:
+        drain_spool(conn, paths.db_path)
+    return conn
+
+
 def _cmd_status(args) -> int:
+    from .config import load_config, config_path
+    from .spool import resolve_db_path
+
     paths = resolve_db_path(args.db)
     cfg = load_config(args.db)
     print("TimeTrace status")
@@ -165,12 +363,22 @@ def _cmd_status(args) -> int:
     return 0
 
 
+@lru_cache(maxsize=64)
+def _abspath(p: str) -> str:
+    # The process cwd never changes, so relative paths resolve the same way each time.
+    return os.path.abspath(p)
+
+
 def _active_session(conn) -> int | None:
+    from .db import get_active_session_id
+
     return get_active_session_id(conn)
 
 
 def _window(args) -> tuple[datetime, datetime, str]:
-    now_local = datetime.now().astimezone()
+    from .report import local_day_bounds, to_utc
+
+    now_local = datetime.now(_LOCAL_TZ)
     if getattr(args, "today", False):
         start_local, end_local = local_day_bounds(now_local)
         title = f"TimeTrace — {start_local.strftime('%b %d, %Y')} (today)"
@@ -188,21 +396,23 @@ def _window(args) -> tuple[datetime, datetime, str]:
     return to_utc(start_local), to_utc(end_local), title
 
 
-def _cmd_run(conn, args, *, explicit_db: str | None) -> int:
+def _cmd_run(args, *, explicit_db: str | None) -> int:
+    import subprocess
+
+    from .config import load_ignore_rules, is_ignored
+    from .db import insert_run, drain_spool
+    from .spool import resolve_db_path
+
     cmd = args.command
     if not cmd:
         print("Error: No command provided. Usage: timetrace run -- <command...>", file=sys.stderr)
         return 2
-    if args.double_dash != "--":
-        if args.double_dash:
-            cmd = [args.double_dash] + cmd
-        print("Note: For best results, use `timetrace run -- <command...>`.", file=sys.stderr)
 
     cwd = args.cwd or os.getcwd()
     safe_cmd_str = sanitize_command(cmd)
 
-    cfg = load_config(explicit_db)
-    if cfg.should_ignore(safe_cmd_str):
+    prefixes, patterns = load_ignore_rules(explicit_db)
+    if is_ignored(safe_cmd_str, prefixes, patterns):
         try:
             proc = subprocess.run(cmd, cwd=cwd)
             return int(proc.returncode)
@@ -210,7 +420,8 @@ def _cmd_run(conn, args, *, explicit_db: str | None) -> int:
             print(f"Error: Command not found: {cmd[0]!r}", file=sys.stderr)
             return 127
 
-    cat = categorize(safe_cmd_str)
+    # The pending spool is replayed after the command, not between Enter and its start.
+    conn = _open_db(explicit_db, drain=False)
     session_id = _active_session(conn)
 
     started = datetime.now(timezone.utc)
@@ -227,14 +438,19 @@ def _cmd_run(conn, args, *, explicit_db: str | None) -> int:
         finished = datetime.now(timezone.utc)
 
     duration_s = max(0.0, (finished - started).total_seconds())
+    # Categorizing (and importing the rules) waits until the user's command has finished.
+    from .categorize import categorize
 
+    cat = categorize(safe_cmd_str)
+
+    drain_spool(conn, resolve_db_path(explicit_db).db_path)
     run_id = insert_run(
         conn,
         started_at_utc=started,
         finished_at_utc=finished,
         duration_s=duration_s,
         exit_code=exit_code,
-        cwd=os.path.abspath(cwd),
+        cwd=_abspath(cwd),
         command=safe_cmd_str,
         tag=args.tag,
         project=args.project,
@@ -257,22 +473,52 @@ def _cmd_run(conn, args, *, explicit_db: str | None) -> int:
 
 
 def _parse_dt(s: str) -> datetime:
+    if s[-1:] in ("Z", "z"):
+        s = s[:-1] + "+00:00"
     dt = datetime.fromisoformat(s)
-    if dt.tzinfo is None:
-        dt = dt.astimezone()
+    if dt.tzinfo is not None and dt.utcoffset() == timedelta(0):
+        return dt
+    # astimezone() reads naive values as system local time at that instant (DST-aware).
     return dt.astimezone(timezone.utc)
 
 
-def _cmd_record(conn, args, *, explicit_db: str | None) -> int:
+def _defer_enabled(args) -> bool:
+    return bool(getattr(args, "defer", False)) or os.environ.get("TIMETRACE_DEFER", "") not in ("", "0")
+
+
+def _cmd_record(args, *, explicit_db: str | None) -> int:
+    from .categorize import categorize
+    from .config import load_ignore_rules, is_ignored
+    from .spool import resolve_db_path, spool_run
+
     cmd_str = sanitize_command(args.command.split())
-    cfg = load_config(explicit_db)
-    if cfg.should_ignore(cmd_str):
+    prefixes, patterns = load_ignore_rules(explicit_db)
+    if is_ignored(cmd_str, prefixes, patterns):
         return 0
 
     started = _parse_dt(args.started)
     finished = _parse_dt(args.finished)
     duration_s = max(0.0, (finished - started).total_seconds())
     cat = categorize(cmd_str)
+
+    if _defer_enabled(args):
+        spool_run(
+            resolve_db_path(explicit_db).db_path,
+            started_at_utc=started,
+            finished_at_utc=finished,
+            duration_s=duration_s,
+            exit_code=int(args.exit),
+            cwd=_abspath(args.cwd),
+            command=cmd_str,
+            tag=args.tag,
+            project=args.project,
+            category=cat,
+        )
+        return 0
+
+    from .db import insert_run
+
+    conn = _open_db(explicit_db)
     session_id = _active_session(conn)
 
     insert_run(
@@ -281,7 +527,7 @@ def _cmd_record(conn, args, *, explicit_db: str | None) -> int:
         finished_at_utc=finished,
         duration_s=duration_s,
         exit_code=int(args.exit),
-        cwd=os.path.abspath(args.cwd),
+        cwd=_abspath(args.cwd),
         command=cmd_str,
         tag=args.tag,
         project=args.project,
@@ -291,9 +537,17 @@ def _cmd_record(conn, args, *, explicit_db: str | None) -> int:
     return 0
 
 
-def _cmd_report(conn, args) -> int:
+def _cmd_report(args) -> int:
+    from .db import fetch_report_groups_between
+    from .report import build_report_from_groups, render_report_text
+
+    conn = _open_db(args.db, create=False)
+    if conn is None:
+        print("No runs recorded yet.")
+        return 0
     start_utc, end_utc, title = _window(args)
-    runs = fetch_runs_between(
+    # SQLite does the per-run aggregation; Python folds and ranks the few group rows.
+    groups = fetch_report_groups_between(
         conn,
         start_utc=start_utc,
         end_utc=end_utc,
@@ -305,35 +559,61 @@ def _cmd_report(conn, args) -> int:
     )
     if args.session is not None:
         title = f"{title}  (session {args.session})"
-    rep = build_report(runs, title=title)
+    rep = build_report_from_groups(groups, title=title)
     print(render_report_text(rep))
     return 0
 
 
-def _cmd_list(conn, args) -> int:
-    runs = fetch_recent_runs(conn, limit=args.limit)
-    if not runs:
+_LIST_FMT = "  #%-5d %s  %8s  %-9s  proj=%s  cat=%s  tag=%s  sess=%s  %s"
+
+
+def _cmd_list(args) -> int:
+    from .db import iter_recent_run_rows
+
+    conn = _open_db(args.db, create=False)
+    if conn is None:
+        print("No runs recorded yet.")
+        return 0
+    rows = list(iter_recent_run_rows(conn, limit=args.limit, before_id=args.before))
+    if not rows:
         print("No runs recorded yet.")
         return 0
 
-    print(f"Recent runs (showing {len(runs)}):")
-    for r in runs:
-        status = "ok" if r.exit_code == 0 else f"fail({r.exit_code})"
-        proj = r.project or "-"
-        cat = r.category or "-"
-        tag = r.tag or "-"
-        sess = r.session_name or ("-" if not r.session_id else f"#{r.session_id}")
-        when = r.started_at_utc.astimezone().strftime("%Y-%m-%d %H:%M:%S")
-        print(
-            f"  #{r.id:<5} {when}  {format_duration(r.duration_s):>8}  {status:<9}  "
-            f"proj={proj}  cat={cat}  tag={tag}  sess={sess}  {r.command}"
+    lines = [f"Recent runs (showing {len(rows)}):"]
+    for r in rows:
+        rid, started_us, _, duration_s, exit_code, _, command, tag, project, category, sid, sname = r
+        status = "ok" if exit_code == 0 else f"fail({exit_code})"
+        sess = sname or ("-" if not sid else f"#{sid}")
+        # Only whole seconds are shown; fromtimestamp() applies the system zone's
+        # offset for that instant, so rows on the far side of a DST change stay right.
+        when = datetime.fromtimestamp(started_us // 1_000_000).strftime("%Y-%m-%d %H:%M:%S")
+        lines.append(
+            _LIST_FMT
+            % (
+                rid,
+                when,
+                format_duration(duration_s),
+                status,
+                project or "-",
+                category or "-",
+                tag or "-",
+                sess,
+                command,
+            )
         )
+    sys.stdout.write("\n".join(lines) + "\n")
     return 0
 
 
-def _cmd_export(conn, args) -> int:
+def _cmd_export(args) -> int:
+    import csv
+
+    from .db import iter_run_rows_between
+
+    conn = _open_db(args.db)
     start_utc, end_utc, _title = _window(args)
-    runs = fetch_runs_between(
+    # Raw rows come straight off the cursor, already in `fieldnames` order.
+    rows = iter_run_rows_between(
         conn,
         start_utc=start_utc,
         end_utc=end_utc,
@@ -344,86 +624,111 @@ def _cmd_export(conn, args) -> int:
         session_id=args.session,
     )
 
-    rows = []
-    for r in runs:
-        rows.append(
-            {
-                "id": r.id,
-                "started_at": r.started_at_utc.isoformat(),
-                "finished_at": r.finished_at_utc.isoformat(),
-                "duration_s": r.duration_s,
-                "exit_code": r.exit_code,
-                "cwd": r.cwd,
-                "command": r.command,
-                "tag": r.tag,
-                "project": r.project,
-                "category": r.category,
-                "session_id": r.session_id,
-                "session_name": r.session_name,
-            }
-        )
-
-    if args.format == "json":
-        payload = json.dumps(rows, indent=2)
-        if args.out:
-            Path(args.out).write_text(payload, encoding="utf-8")
-            print(f"Wrote {len(rows)} rows to {args.out}")
-        else:
-            print(payload)
-        return 0
-
+    fieldnames = [
+        "id",
+        "started_at",
+        "finished_at",
+        "duration_s",
+        "exit_code",
+        "cwd",
+        "command",
+        "tag",
+        "project",
+        "category",
+        "session_id",
+        "session_name",
+    ]
+
+    # JSON is encoded straight to bytes (orjson's native output), so it skips the
+    # text layer; CSV goes through csv.writer and needs a text stream.
+    as_bytes = args.format == "json"
     if args.out:
-        out_f = open(args.out, "w", newline="", encoding="utf-8")
+        if as_bytes:
+            out_f = open(args.out, "wb")
+        else:
+            out_f = open(args.out, "w", newline="", encoding="utf-8")
         close = True
     else:
         out_f = sys.stdout
         close = False
-
+        if as_bytes:
+            # Replaced or captured stdout (e.g. io.StringIO) may have no binary layer.
+            buffer = getattr(sys.stdout, "buffer", None)
+            if buffer is not None:
+                sys.stdout.flush()
+                out_f = buffer
+            else:
+                as_bytes = False
+
+    # Rows are written as they are read rather than collected first.
+    count = 0
     try:
-        fieldnames = [
-            "id",
-            "started_at",
-            "finished_at",
-            "duration_s",
-            "exit_code",
-            "cwd",
-            "command",
-            "tag",
-            "project",
-            "category",
-            "session_id",
-            "session_name",
-        ]
-        w = csv.DictWriter(out_f, fieldnames=fieldnames)
-        w.writeheader()
-        for row in rows:
-            w.writerow(row)
+        if args.format == "json":
+            dumps = _json_encoder()
+            if as_bytes:
+                write = out_f.write
+            else:
+
+                def write(b: bytes) -> None:
+                    out_f.write(b.decode("utf-8"))
+
+            write(b"[")
+            for row in rows:
+                write(b",\n  " if count else b"\n  ")
+                write(dumps(dict(zip(fieldnames, row))))
+                count += 1
+            write(b"\n]\n" if count else b"]\n")
+        else:
+            w = csv.writer(out_f)
+            w.writerow(fieldnames)
+            for row in rows:
+                w.writerow(row)
+                count += 1
     finally:
         if close:
             out_f.close()
-            print(f"Wrote {len(rows)} rows to {args.out}")
+            print(f"Wrote {count} rows to {args.out}")
+        else:
+            out_f.flush()
     return 0
 
 
-def _cmd_session(conn, args) -> int:
+def _cmd_session(args) -> int:
+    from .db import (
+        get_active_session_id,
+        set_active_session_id,
+        create_session,
+        end_session,
+        fetch_sessions,
+        fetch_session_by_id,
+        write_transaction,
+    )
+
+    conn = _open_db(args.db)
+
     sc = args.session_cmd
     if sc == "start":
-        active = get_active_session_id(conn)
+        # Check and claim the active slot under one write lock and one commit.
+        with write_transaction(conn):
+            active = get_active_session_id(conn)
+            if active is None:
+                sid = create_session(conn, name=args.name, started_at_utc=datetime.now(timezone.utc))
+                set_active_session_id(conn, sid)
         if active is not None:
             print(f"A session is already active (id={active}). Stop it first.")
             return 2
-        sid = create_session(conn, name=args.name, started_at_utc=datetime.now(timezone.utc))
-        set_active_session_id(conn, sid)
         print(f"Started session #{sid}: {args.name}")
         return 0
 
     if sc == "stop":
-        active = get_active_session_id(conn)
+        with write_transaction(conn):
+            active = get_active_session_id(conn)
+            if active is not None:
+                end_session(conn, session_id=active, ended_at_utc=datetime.now(timezone.utc))
+                set_active_session_id(conn, None)
         if active is None:
             print("No active session.")
             return 0
-        end_session(conn, session_id=active, ended_at_utc=datetime.now(timezone.utc))
-        set_active_session_id(conn, None)
         print(f"Stopped session #{active}.")
         return 0
 
@@ -432,12 +737,8 @@ def _cmd_session(conn, args) -> int:
         if active is None:
             print("No active session.")
             return 0
-        sessions = fetch_sessions(conn, limit=50)
-        name = None
-        for s in sessions:
-            if s["id"] == active:
-                name = s["name"]
-                break
+        row = fetch_session_by_id(conn, active)
+        name = row["name"] if row else None
         if name:
             print(f"Active session: #{active} — {name}")
         else:
@@ -459,6 +760,8 @@ def _cmd_session(conn, args) -> int:
 
 
 def _cmd_ignore(args, *, explicit_db: str | None) -> int:
+    from .config import load_config, save_config
+
     cfg = load_config(explicit_db)
     ic = args.ignore_cmd
 
@@ -518,11 +821,37 @@ def _init_script(shell: str) -> str:
 #   unset TIMETRACE__LAST_CMD TIMETRACE__START_ISO
 #   trap - DEBUG
 
+# Timestamps come from shell builtins (bash >= 5, zsh/datetime) or date(1);
+# spawning an interpreter here would run twice per command.
+if [ -n "${ZSH_VERSION:-}" ]; then
+  zmodload zsh/datetime 2>/dev/null
+fi
+# Without EPOCHREALTIME, probe once whether date(1) has %6N (GNU does, BSD doesn't).
+if [ -z "${EPOCHREALTIME:-}" ]; then
+  case "$(date -u +%6N 2>/dev/null)" in
+    [0-9][0-9][0-9][0-9][0-9][0-9]) TIMETRACE__DATE_US=1 ;;
+  esac
+fi
+
 timetrace__iso_now() {
-  python - <<'PY'
-from datetime import datetime, timezone
-print(datetime.now(timezone.utc).isoformat())
-PY
+  if [ -n "${EPOCHREALTIME:-}" ]; then
+    local s="$EPOCHREALTIME"
+    local frac="${s#*[.,]}000000"
+    if [ -n "${BASH_VERSION:-}" ]; then
+      TZ=UTC printf '%(%Y-%m-%dT%H:%M:%S)T.%s+00:00\n' "${s%[.,]*}" "${frac:0:6}"
+    else
+      # zsh: strftime formats local time; append its offset as +HH:MM.
+      local t z
+      strftime -s t '%Y-%m-%dT%H:%M:%S' "${s%[.,]*}"
+      strftime -s z '%z' "${s%[.,]*}"
+      printf '%s.%s%s:%s\n' "$t" "${frac:0:6}" "${z:0:3}" "${z:3:2}"
+    fi
+  elif [ "${TIMETRACE__DATE_US:-0}" = 1 ]; then
+    date -u +%Y-%m-%dT%H:%M:%S.%6N+00:00
+  else
+    # Last resort (e.g. macOS bash 3.2): whole seconds only.
+    date -u +%Y-%m-%dT%H:%M:%S+00:00
+  fi
 }
 
 timetrace__record() {
@@ -533,7 +862,7 @@ timetrace__record() {
   local cwd="$5"
   local project="${TIMETRACE_PROJECT:-}"
   local tag="${TIMETRACE_TAG:-}"
-  timetrace record --started "$start_iso" --finished "$end_iso" --exit "$exit_code" --cwd "$cwd" --command "$cmd" ${tag:+--tag "$tag"} ${project:+--project "$project"} >/dev/null 2>&1 || true
+  timetrace record --started "$start_iso" --finished "$end_iso" --exit "$exit_code" --cwd "$cwd" --command "$cmd" ${tag:+--tag "$tag"} ${project:+--project "$project"} --defer >/dev/null 2>&1 || true
 }
 
 timetrace__preexec() {
@@ -575,32 +904,48 @@ fi
 #   if ($global:TimetraceOriginalPrompt) { Set-Item function:prompt $global:TimetraceOriginalPrompt }
 
 $global:TimetraceLastHistoryId = -1
+$global:TimetraceLastEnd = [datetime]::MinValue
+# Record in a background thread job when available so the prompt returns immediately.
+$global:TimetraceAsync = [bool](Get-Command Start-ThreadJob -ErrorAction SilentlyContinue)
 
 if (-not $global:TimetraceOriginalPrompt) {
     $global:TimetraceOriginalPrompt = (Get-Item function:prompt).ScriptBlock
 }
 
 function global:TimetracePrompt {
+    $savedExit = $global:LASTEXITCODE
     try {
         $h = Get-History -Count 1
-        if ($null -ne $h -and $h.Id -ne $global:TimetraceLastHistoryId) {
+        # Prompts that follow no new command (e.g. plain Enter) stop here, before any formatting.
+        if ($null -ne $h -and $h.Id -ne $global:TimetraceLastHistoryId -and $h.EndExecutionTime -gt $global:TimetraceLastEnd) {
             $global:TimetraceLastHistoryId = $h.Id
+            $global:TimetraceLastEnd = $h.EndExecutionTime
             $cmd = $h.CommandLine
             $started = $h.StartExecutionTime.ToUniversalTime().ToString("o")
             $finished = $h.EndExecutionTime.ToUniversalTime().ToString("o")
-            $exitCode = $LASTEXITCODE
+            $exitCode = if ($null -ne $savedExit) { $savedExit } else { 0 }
             $cwd = (Get-Location).Path
             $project = $env:TIMETRACE_PROJECT
             $tag = $env:TIMETRACE_TAG
-            $args = @("record","--started",$started,"--finished",$finished,"--exit",$exitCode,"--cwd",$cwd,"--command",$cmd)
-            if ($tag) { $args += @("--tag",$tag) }
-            if ($project) { $args += @("--project",$project) }
-            & timetrace @args | Out-Null
+            $recordArgs = @("record","--started",$started,"--finished",$finished,"--exit",$exitCode,"--cwd",$cwd,"--command",$cmd,"--defer")
+            if ($tag) { $recordArgs += @("--tag",$tag) }
+            if ($project) { $recordArgs += @("--project",$project) }
+            if ($global:TimetraceAsync) {
+                Get-Job -Name TimetraceRecord -ErrorAction SilentlyContinue | Where-Object State -eq 'Completed' | Remove-Job
+                $null = Start-ThreadJob -Name TimetraceRecord -ArgumentList (,$recordArgs) -ScriptBlock {
+                    param($a)
+                    & timetrace @a | Out-Null
+                }
+            } else {
+                & timetrace @recordArgs | Out-Null
+            }
         }
     } catch {
         # ignore hook failures
     }
 
+    # Keep the user's last exit code intact for their own prompt.
+    $global:LASTEXITCODE = $savedExit
     & $global:TimetraceOriginalPrompt
 }
 
@@ -3,10 +3,11 @@ from __future__ import annotations
 import json
 import re
 from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
 from typing import Iterable, Optional
 
-from .db import resolve_db_path
+from .spool import resolve_db_path
 
 DEFAULT_IGNORE_PREFIXES = [
     "cd",
@@ -20,51 +21,140 @@ DEFAULT_IGNORE_PREFIXES = [
     "timetrace",  # avoid recursive logging
 ]
 
+_CONFIG_CACHE: dict[str, tuple[float, "TTConfig"]] = {}
+
+
+# Numeric/named backreferences would be renumbered or collide inside an alternation.
+_BACKREF_RE = re.compile(r"\\\d|\(\?P=")
+
+
+def _compile_patterns(patterns: Iterable[str]) -> list[re.Pattern]:
+    """Compile the valid patterns, fused into a single alternation where possible."""
+    valid: list[str] = []
+    compiled: list[re.Pattern] = []
+    for pat in patterns:
+        try:
+            compiled.append(re.compile(pat))
+        except re.error:
+            # Ignore invalid regex entries rather than breaking the tool
+            continue
+        valid.append(pat)
+    if len(valid) < 2 or any(_BACKREF_RE.search(p) for p in valid):
+        return compiled
+    try:
+        return [re.compile("|".join(f"(?:{p})" for p in valid))]
+    except re.error:
+        # e.g. inline global flags or duplicate group names across patterns
+        return compiled
+
+
 @dataclass
 class TTConfig:
     ignore_prefixes: list[str] = field(default_factory=lambda: list(DEFAULT_IGNORE_PREFIXES))
     ignore_regex: list[str] = field(default_factory=list)
+    _prefix_set: frozenset[str] = field(init=False, repr=False, compare=False)
+    _compiled_regex: list[re.Pattern] = field(init=False, repr=False, compare=False)
+    # Copies of the lists the derived state above was built from.
+    _built_from: tuple[list[str], list[str]] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        self._built_from = (list(self.ignore_prefixes), list(self.ignore_regex))
+        self._prefix_set = frozenset(self.ignore_prefixes)
+        self._compiled_regex = _compile_patterns(self.ignore_regex)
 
     def should_ignore(self, command_str: str) -> bool:
-        s = command_str.strip()
-        if not s:
-            return True
-        first = s.split()[0].strip("'"")
-        if first in self.ignore_prefixes:
+        # Fields can be reassigned or mutated after construction; list equality is a
+        # cheap C-level check compared with recompiling on every call.
+        prefixes, regex = self._built_from
+        if self.ignore_prefixes != prefixes or self.ignore_regex != regex:
+            self._rebuild()
+        return is_ignored(command_str, self._prefix_set, self._compiled_regex)
+
+
+def is_ignored(command_str: str, prefixes: Iterable[str], patterns: Iterable[re.Pattern]) -> bool:
+    """Return True if the command's first word is an ignored prefix or a pattern matches.
+
+    `prefixes` should be a set; `patterns` is normally one fused regex (see `_compile_patterns`).
+    """
+    s = command_str.strip()
+    if not s:
+        return True
+    first = s.split(None, 1)[0].strip("'\"")
+    if first in prefixes:
+        return True
+    for rx in patterns:
+        if rx.search(s):
             return True
-        for pat in self.ignore_regex:
-            try:
-                if re.search(pat, s):
-                    return True
-            except re.error:
-                # Ignore invalid regex entries rather than breaking the tool
-                continue
-        return False
+    return False
 
 
+@lru_cache(maxsize=8)
 def config_path(explicit_db_path: Optional[str] = None) -> Path:
     paths = resolve_db_path(explicit_db_path)
     return paths.data_dir / "config.json"
 
 
 def load_config(explicit_db_path: Optional[str] = None) -> TTConfig:
+    """Load the config, reusing the parsed copy while the file is unchanged."""
     p = config_path(explicit_db_path)
-    if not p.exists():
+    key = str(p)
+    try:
+        mtime = p.stat().st_mtime
+    except OSError:
         return TTConfig()
+
+    cached = _CONFIG_CACHE.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
     try:
         data = json.loads(p.read_text(encoding="utf-8"))
     except Exception:
         return TTConfig()
 
-    cfg = TTConfig()
+    kwargs: dict[str, list[str]] = {}
     if isinstance(data, dict):
         if isinstance(data.get("ignore_prefixes"), list):
-            cfg.ignore_prefixes = [str(x) for x in data["ignore_prefixes"]]
+            kwargs["ignore_prefixes"] = [str(x) for x in data["ignore_prefixes"]]
         if isinstance(data.get("ignore_regex"), list):
-            cfg.ignore_regex = [str(x) for x in data["ignore_regex"]]
+            kwargs["ignore_regex"] = [str(x) for x in data["ignore_regex"]]
+    cfg = TTConfig(**kwargs)
+    _CONFIG_CACHE[key] = (mtime, cfg)
     return cfg
 
 
+def load_ignore_rules(
+    explicit_db_path: Optional[str] = None,
+) -> tuple[frozenset[str], tuple[re.Pattern, ...]]:
+    """Return only the (prefixes, compiled patterns) needed by the tracking hot path."""
+    p = config_path(explicit_db_path)
+    try:
+        mtime: Optional[float] = p.stat().st_mtime
+    except OSError:
+        mtime = None
+    return _ignore_rules(str(p), mtime)
+
+
+@lru_cache(maxsize=4)
+def _ignore_rules(path: str, mtime: Optional[float]) -> tuple[frozenset[str], tuple[re.Pattern, ...]]:
+    prefixes: list[str] = list(DEFAULT_IGNORE_PREFIXES)
+    patterns: list[str] = []
+    if mtime is not None:
+        try:
+            data = json.loads(Path(path).read_text(encoding="utf-8"))
+        except Exception:
+            data = None
+        if isinstance(data, dict):
+            if isinstance(data.get("ignore_prefixes"), list):
+                prefixes = [str(x) for x in data["ignore_prefixes"]]
+            if isinstance(data.get("ignore_regex"), list):
+                patterns = [str(x) for x in data["ignore_regex"]]
+    return frozenset(prefixes), tuple(_compile_patterns(patterns))
+
+
 def save_config(cfg: TTConfig, explicit_db_path: Optional[str] = None) -> Path:
     p = config_path(explicit_db_path)
     payload = {
@@ -72,4 +162,6 @@ def save_config(cfg: TTConfig, explicit_db_path: Optional[str] = None) -> Path:
         "ignore_regex": cfg.ignore_regex,
     }
     p.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    # The caller may have mutated a cached instance; force a re-read next time.
+    _CONFIG_CACHE.pop(str(p), None)
     return p
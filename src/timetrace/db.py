@@ -1,82 +1,251 @@
 from __future__ import annotations
 
+import os
 import sqlite3
-from dataclasses import dataclass
-from datetime import datetime, timezone
+import sys
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import chain, islice
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 
 from .models import RunRecord
-from .utils import ensure_dir, default_data_dir
+# Path and spool helpers live in a module without sqlite3 so `record --defer`
+# can use them cheaply; re-exported here for existing callers.
+from .spool import DBPaths, resolve_db_path, spool_path, spool_run, _spool_lock  # noqa: F401
+from .utils import to_iso
 
 
-SCHEMA_VERSION = 3
-
-
-def to_iso(dt: datetime) -> str:
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc).isoformat()
+SCHEMA_VERSION = 8
 
 
 def from_iso(s: str) -> datetime:
     return datetime.fromisoformat(s)
 
 
-@dataclass(frozen=True)
-class DBPaths:
-    data_dir: Path
-    db_path: Path
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_US = timedelta(microseconds=1)
 
 
-def resolve_db_path(explicit_path: Optional[str] = None) -> DBPaths:
-    if explicit_path:
-        p = Path(explicit_path).expanduser().resolve()
-        ensure_dir(p.parent)
-        return DBPaths(data_dir=p.parent, db_path=p)
+def to_us(dt: datetime) -> int:
+    """Epoch microseconds (UTC) for an aware datetime; naive values are taken as UTC."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // _ONE_US
+
 
-    data_dir = default_data_dir()
-    ensure_dir(data_dir)
-    db_path = data_dir / "timetrace.db"
-    return DBPaths(data_dir=data_dir, db_path=db_path)
+def from_us(us: int) -> datetime:
+    # Positional timedelta args skip keyword parsing; this runs twice per fetched run.
+    return _EPOCH + timedelta(0, 0, us)
 
 
 def connect(db_path: Path) -> sqlite3.Connection:
-    conn = sqlite3.connect(str(db_path))
+    # Autocommit mode: single-statement writes commit on their own, and multi-statement
+    # writes use `write_transaction` rather than the sqlite3 module's implicit BEGIN sniffing.
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON;")
-    conn.execute("PRAGMA journal_mode = WAL;")
-    conn.execute("PRAGMA synchronous = NORMAL;")
+    # WAL + NORMAL: one append per commit, DB-file fsync deferred to checkpoints.
+    # A crash can lose the last few runs, which is acceptable for time tracking.
+    pragmas = [
+        "PRAGMA journal_mode = WAL;",
+        "PRAGMA synchronous = NORMAL;",
+        # Wait up to 30s for a concurrent writer (e.g. two shells recording at once).
+        "PRAGMA busy_timeout = 30000;",
+        "PRAGMA cache_size = -65536;",  # 64 MiB page cache
+        "PRAGMA temp_store = MEMORY;",
+        "PRAGMA journal_size_limit = 67108864;",  # truncate the WAL back to 64 MiB
+    ]
+    if sys.maxsize > 2**32:
+        # A 256 MiB mapping can exhaust the address space of a 32-bit process.
+        pragmas.append("PRAGMA mmap_size = 268435456;")
+    for pragma in pragmas:
+        try:
+            conn.execute(pragma)
+        except sqlite3.DatabaseError:
+            # e.g. read-only media where WAL cannot be enabled; keep going with defaults
+            continue
     return conn
 
 
+@contextmanager
+def write_transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Run the block in one BEGIN IMMEDIATE ... COMMIT, rolling back on error.
+
+    Nested blocks (including the ones inside `insert_runs_many`) join the
+    outermost transaction, so a script can chain session and run writes under
+    a single commit.
+    """
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK;")
+        raise
+    conn.execute("COMMIT;")
+
+
 def _table_has_column(conn: sqlite3.Connection, table: str, col: str) -> bool:
     rows = conn.execute(f"PRAGMA table_info({table});").fetchall()
     return any(r["name"] == col for r in rows)
 
 
+def _schema_version(conn: sqlite3.Connection) -> int:
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key='schema_version';").fetchone()
+    except sqlite3.OperationalError:
+        # Fresh database: no meta table yet.
+        return 0
+    if row is None:
+        return 0
+    try:
+        return int(row["value"])
+    except (TypeError, ValueError):
+        return 0
+
+
+# Timestamps are INTEGER microseconds since the Unix epoch (UTC); see to_us/from_us.
+_SCHEMA_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        started_at_us INTEGER NOT NULL,
+        ended_at_us INTEGER
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_at_us INTEGER NOT NULL,
+        finished_at_us INTEGER NOT NULL,
+        duration_s REAL NOT NULL,
+        exit_code INTEGER NOT NULL,
+        cwd TEXT NOT NULL,
+        command TEXT NOT NULL,
+        tag TEXT,
+        project TEXT,
+        category TEXT,
+        session_id INTEGER,
+        FOREIGN KEY(session_id) REFERENCES sessions(id)
+    );
+    """,
+)
+
+_INDEX_DDL = (
+    "CREATE INDEX IF NOT EXISTS idx_sessions_started ON sessions(started_at_us);",
+    "CREATE INDEX IF NOT EXISTS idx_sessions_name ON sessions(name);",
+    "CREATE INDEX IF NOT EXISTS idx_runs_started_us ON runs(started_at_us);",
+    "CREATE INDEX IF NOT EXISTS idx_runs_cwd ON runs(cwd);",
+    # Equality filter + time range + ORDER BY started: one index range scan, no sort.
+    # Tag/project/category are only ever filtered with `= ?`, which implies IS NOT NULL,
+    # so the indexes skip the (mostly NULL) untagged rows. Schema 7 built them over
+    # every row; drop and rebuild those as partial indexes.
+    "DROP INDEX IF EXISTS idx_runs_tag_started;",
+    "DROP INDEX IF EXISTS idx_runs_project_started;",
+    "DROP INDEX IF EXISTS idx_runs_category_started;",
+    "CREATE INDEX idx_runs_tag_started ON runs(tag, started_at_us) WHERE tag IS NOT NULL;",
+    "CREATE INDEX idx_runs_project_started ON runs(project, started_at_us) WHERE project IS NOT NULL;",
+    "CREATE INDEX idx_runs_category_started ON runs(category, started_at_us) WHERE category IS NOT NULL;",
+    # Kept whole: it also serves foreign-key lookups on runs.session_id.
+    "CREATE INDEX IF NOT EXISTS idx_runs_session_started ON runs(session_id, started_at_us);",
+    # Superseded by idx_runs_session_started (same leading column).
+    "DROP INDEX IF EXISTS idx_runs_session;",
+)
+
+
 def init_db(conn: sqlite3.Connection) -> None:
-    conn.executescript(
+    # Already migrated: skip the schema DDL, PRAGMA table_info scans and index DDL.
+    if _schema_version(conn) == SCHEMA_VERSION:
+        return
+
+    # Databases before schema 6 stored ISO-8601 TEXT timestamps; rebuild them.
+    # Tables are dropped and recreated, which foreign keys would reject mid-way.
+    # The pragma is a no-op inside a transaction, so toggle it around one. This
+    # unlocked read only decides the toggle; a database only ever moves from
+    # legacy to current, so a stale answer at worst disables foreign keys needlessly.
+    legacy = _table_has_column(conn, "sessions", "started_at_utc") or _table_has_column(
+        conn, "runs", "started_at_utc"
+    )
+    if legacy:
+        conn.execute("PRAGMA foreign_keys = OFF;")
+    try:
+        # Statement by statement rather than executescript, which would commit
+        # after each script: creation, rebuild, indexes and the version marker
+        # land in one commit.
+        with write_transaction(conn):
+            # Re-read under the write lock: another process may have migrated the
+            # database while this one waited for it.
+            version = _schema_version(conn)
+            if version == SCHEMA_VERSION:
+                return
+            for stmt in _SCHEMA_DDL:
+                conn.execute(stmt)
+            if _table_has_column(conn, "sessions", "started_at_utc"):
+                _rebuild_legacy_sessions(conn)
+            if _table_has_column(conn, "runs", "started_at_utc"):
+                _rebuild_legacy_runs(conn)
+            # Indexes come after the rebuild: dropping a legacy table drops its indexes too.
+            for stmt in _INDEX_DDL:
+                conn.execute(stmt)
+            if version < SCHEMA_VERSION:
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta(key, value) VALUES('schema_version', ?);", (str(SCHEMA_VERSION),)
+                )
+    finally:
+        if legacy:
+            conn.execute("PRAGMA foreign_keys = ON;")
+
+
+def _iso_to_us(s: Optional[str]) -> Optional[int]:
+    return to_us(from_iso(s)) if s is not None else None
+
+
+def _rebuild_legacy_sessions(conn: sqlite3.Connection) -> None:
+    rows = conn.execute("SELECT id, name, started_at_utc, ended_at_utc FROM sessions;").fetchall()
+    conn.execute(
         """
-        CREATE TABLE IF NOT EXISTS meta (
-            key TEXT PRIMARY KEY,
-            value TEXT NOT NULL
-        );
-
-        CREATE TABLE IF NOT EXISTS sessions (
+        CREATE TABLE sessions_new (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
-            started_at_utc TEXT NOT NULL,
-            ended_at_utc TEXT
+            started_at_us INTEGER NOT NULL,
+            ended_at_us INTEGER
         );
+        """
+    )
+    conn.executemany(
+        "INSERT INTO sessions_new(id, name, started_at_us, ended_at_us) VALUES(?, ?, ?, ?);",
+        ((r["id"], r["name"], _iso_to_us(r["started_at_utc"]), _iso_to_us(r["ended_at_utc"])) for r in rows),
+    )
+    conn.execute("DROP TABLE sessions;")
+    conn.execute("ALTER TABLE sessions_new RENAME TO sessions;")
 
-        CREATE INDEX IF NOT EXISTS idx_sessions_started ON sessions(started_at_utc);
-        CREATE INDEX IF NOT EXISTS idx_sessions_name ON sessions(name);
 
-        CREATE TABLE IF NOT EXISTS runs (
+def _rebuild_legacy_runs(conn: sqlite3.Connection) -> None:
+    # Columns added over time may be missing, and pre-v4 rows have no integer timestamps.
+    have = {r["name"] for r in conn.execute("PRAGMA table_info(runs);")}
+    late_cols = ("tag", "project", "category", "session_id", "started_at_us", "finished_at_us")
+    optional = ", ".join(c if c in have else f"NULL AS {c}" for c in late_cols)
+    rows = conn.execute(
+        "SELECT id, started_at_utc, finished_at_utc, duration_s, exit_code, cwd, command, "
+        f"{optional} FROM runs;"
+    ).fetchall()
+    conn.execute(
+        """
+        CREATE TABLE runs_new (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            started_at_utc TEXT NOT NULL,
-            finished_at_utc TEXT NOT NULL,
+            started_at_us INTEGER NOT NULL,
+            finished_at_us INTEGER NOT NULL,
             duration_s REAL NOT NULL,
             exit_code INTEGER NOT NULL,
             cwd TEXT NOT NULL,
@@ -87,36 +256,31 @@ def init_db(conn: sqlite3.Connection) -> None:
             session_id INTEGER,
             FOREIGN KEY(session_id) REFERENCES sessions(id)
         );
-
-        CREATE INDEX IF NOT EXISTS idx_runs_started ON runs(started_at_utc);
-        CREATE INDEX IF NOT EXISTS idx_runs_cwd ON runs(cwd);
-        CREATE INDEX IF NOT EXISTS idx_runs_tag ON runs(tag);
-        CREATE INDEX IF NOT EXISTS idx_runs_project ON runs(project);
-        CREATE INDEX IF NOT EXISTS idx_runs_category ON runs(category);
-        CREATE INDEX IF NOT EXISTS idx_runs_session ON runs(session_id);
         """
     )
-
-    # If upgrading from older versions, columns may be missing in runs.
-    if not _table_has_column(conn, "runs", "project"):
-        conn.execute("ALTER TABLE runs ADD COLUMN project TEXT;")
-    if not _table_has_column(conn, "runs", "category"):
-        conn.execute("ALTER TABLE runs ADD COLUMN category TEXT;")
-    if not _table_has_column(conn, "runs", "session_id"):
-        conn.execute("ALTER TABLE runs ADD COLUMN session_id INTEGER;")
-
-    cur = conn.execute("SELECT value FROM meta WHERE key='schema_version';")
-    row = cur.fetchone()
-    if row is None:
-        conn.execute("INSERT INTO meta(key, value) VALUES('schema_version', ?);", (str(SCHEMA_VERSION),))
-    else:
-        try:
-            v = int(row["value"])
-        except Exception:
-            v = 0
-        if v < SCHEMA_VERSION:
-            conn.execute("UPDATE meta SET value=? WHERE key='schema_version';", (str(SCHEMA_VERSION),))
-    conn.commit()
+    # Parsed in Python: SQLite's strftime('%s') would drop the fractional seconds.
+    conn.executemany(
+        "INSERT INTO runs_new(id, started_at_us, finished_at_us, duration_s, exit_code, cwd, command, "
+        "tag, project, category, session_id) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+        (
+            (
+                r["id"],
+                r["started_at_us"] if r["started_at_us"] is not None else _iso_to_us(r["started_at_utc"]),
+                r["finished_at_us"] if r["finished_at_us"] is not None else _iso_to_us(r["finished_at_utc"]),
+                r["duration_s"],
+                r["exit_code"],
+                r["cwd"],
+                r["command"],
+                r["tag"],
+                r["project"],
+                r["category"],
+                r["session_id"],
+            )
+            for r in rows
+        ),
+    )
+    conn.execute("DROP TABLE runs;")
+    conn.execute("ALTER TABLE runs_new RENAME TO runs;")
 
 
 def get_active_session_id(conn: sqlite3.Connection) -> Optional[int]:
@@ -138,39 +302,78 @@ def set_active_session_id(conn: sqlite3.Connection, session_id: Optional[int]) -
             "ON CONFLICT(key) DO UPDATE SET value=excluded.value;",
             (str(int(session_id)),),
         )
-    conn.commit()
 
 
 def create_session(conn: sqlite3.Connection, *, name: str, started_at_utc: datetime) -> int:
     cur = conn.execute(
-        "INSERT INTO sessions(name, started_at_utc) VALUES(?, ?);",
-        (name, to_iso(started_at_utc)),
+        "INSERT INTO sessions(name, started_at_us) VALUES(?, ?);",
+        (name, to_us(started_at_utc)),
     )
-    conn.commit()
     return int(cur.lastrowid)
 
 
 def end_session(conn: sqlite3.Connection, *, session_id: int, ended_at_utc: datetime) -> None:
-    conn.execute("UPDATE sessions SET ended_at_utc=? WHERE id=?;", (to_iso(ended_at_utc), int(session_id)))
-    conn.commit()
+    conn.execute("UPDATE sessions SET ended_at_us=? WHERE id=?;", (to_us(ended_at_utc), int(session_id)))
+
+
+def _session_dict(r: sqlite3.Row) -> dict:
+    return {
+        "id": int(r["id"]),
+        "name": str(r["name"]),
+        "started_at_utc": to_iso(from_us(r["started_at_us"])),
+        "ended_at_utc": (to_iso(from_us(r["ended_at_us"])) if r["ended_at_us"] is not None else None),
+    }
 
 
 def fetch_sessions(conn: sqlite3.Connection, *, limit: int = 50) -> list[dict]:
     rows = conn.execute(
-        "SELECT id, name, started_at_utc, ended_at_utc FROM sessions ORDER BY started_at_utc DESC LIMIT ?;",
+        "SELECT id, name, started_at_us, ended_at_us FROM sessions ORDER BY started_at_us DESC LIMIT ?;",
         (int(limit),),
     ).fetchall()
-    out = []
-    for r in rows:
-        out.append(
-            {
-                "id": int(r["id"]),
-                "name": str(r["name"]),
-                "started_at_utc": str(r["started_at_utc"]),
-                "ended_at_utc": (str(r["ended_at_utc"]) if r["ended_at_utc"] is not None else None),
-            }
-        )
-    return out
+    return [_session_dict(r) for r in rows]
+
+
+def fetch_session_by_id(conn: sqlite3.Connection, session_id: int) -> Optional[dict]:
+    r = conn.execute(
+        "SELECT id, name, started_at_us, ended_at_us FROM sessions WHERE id=?;",
+        (int(session_id),),
+    ).fetchone()
+    return _session_dict(r) if r is not None else None
+
+
+_INSERT_RUN_SQL = """
+    INSERT INTO runs(
+        started_at_us, finished_at_us, duration_s, exit_code, cwd, command, tag, project, category, session_id
+    )
+    VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+"""
+
+
+def _run_params(
+    *,
+    started_at_utc: datetime,
+    finished_at_utc: datetime,
+    duration_s: float,
+    exit_code: int,
+    cwd: str,
+    command: str,
+    tag: Optional[str],
+    project: Optional[str],
+    category: Optional[str],
+    session_id: Optional[int],
+) -> tuple:
+    return (
+        to_us(started_at_utc),
+        to_us(finished_at_utc),
+        float(duration_s),
+        int(exit_code),
+        str(cwd),
+        str(command),
+        tag,
+        project,
+        category,
+        (int(session_id) if session_id is not None else None),
+    )
 
 
 def insert_run(
@@ -187,119 +390,440 @@ def insert_run(
     category: Optional[str],
     session_id: Optional[int],
 ) -> int:
+    # A single autocommitted statement; the constant SQL string hits sqlite3's statement cache.
     cur = conn.execute(
-        """
-        INSERT INTO runs(
-            started_at_utc, finished_at_utc, duration_s, exit_code, cwd, command, tag, project, category, session_id
-        )
-        VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
-        """,
-        (
-            to_iso(started_at_utc),
-            to_iso(finished_at_utc),
-            float(duration_s),
-            int(exit_code),
-            str(cwd),
-            str(command),
-            tag,
-            project,
-            category,
-            (int(session_id) if session_id is not None else None),
+        _INSERT_RUN_SQL,
+        _run_params(
+            started_at_utc=started_at_utc,
+            finished_at_utc=finished_at_utc,
+            duration_s=duration_s,
+            exit_code=exit_code,
+            cwd=cwd,
+            command=command,
+            tag=tag,
+            project=project,
+            category=category,
+            session_id=session_id,
         ),
     )
-    conn.commit()
     return int(cur.lastrowid)
 
 
-def fetch_runs_between(
-    conn: sqlite3.Connection,
-    *,
-    start_utc: datetime,
-    end_utc: datetime,
-    limit: int = 10000,
-    tag: Optional[str] = None,
-    project: Optional[str] = None,
-    category: Optional[str] = None,
-    session_id: Optional[int] = None,
-) -> list[RunRecord]:
-    q = """
-        SELECT
-            r.id, r.started_at_utc, r.finished_at_utc, r.duration_s, r.exit_code, r.cwd, r.command,
-            r.tag, r.project, r.category, r.session_id, s.name AS session_name
+_RUN_PARAM_COUNT = 10
+# Rows per multi-row INSERT, bounded by SQLITE_MAX_VARIABLE_NUMBER (999 before 3.32).
+_MULTI_INSERT_ROWS = (32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999) // _RUN_PARAM_COUNT
+_MULTI_INSERT_RUN_SQL = (
+    "INSERT INTO runs("
+    "started_at_us, finished_at_us, duration_s, exit_code, cwd, command, tag, project, category, session_id"
+    ") VALUES " + ", ".join(["(" + ", ".join(["?"] * _RUN_PARAM_COUNT) + ")"] * _MULTI_INSERT_ROWS) + ";"
+)
+
+
+def insert_runs_many(conn: sqlite3.Connection, rows: Iterable[tuple]) -> int:
+    """Insert many runs in a single transaction.
+
+    Each row is in `_INSERT_RUN_SQL` column order with timestamps already passed
+    through `to_us`. Full chunks go in as one multi-row INSERT each (one bind and
+    step per chunk instead of per row); the remainder uses executemany. Returns
+    the number of rows inserted.
+    """
+    it = iter(rows)
+    count = 0
+    with write_transaction(conn):
+        while True:
+            chunk = list(islice(it, _MULTI_INSERT_ROWS))
+            if len(chunk) < _MULTI_INSERT_ROWS:
+                if chunk:
+                    conn.executemany(_INSERT_RUN_SQL, chunk)
+                return count + len(chunk)
+            conn.execute(_MULTI_INSERT_RUN_SQL, list(chain.from_iterable(chunk)))
+            count += len(chunk)
+
+
+class RunBatch:
+    """Buffers runs and writes them `size` at a time, one transaction per flush.
+
+    A few thousand rows per transaction is where per-commit overhead stops mattering.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, *, size: int = 1000) -> None:
+        self.conn = conn
+        self.size = max(1, int(size))
+        self.count = 0
+        self._rows: list[tuple] = []
+
+    def add(self, **run) -> None:
+        """Queue one run; takes the same keyword arguments as `insert_run`."""
+        self._rows.append(_run_params(**run))
+        if len(self._rows) >= self.size:
+            self.flush()
+
+    def flush(self) -> int:
+        rows, self._rows = self._rows, []
+        n = insert_runs_many(self.conn, rows) if rows else 0
+        self.count += n
+        return n
+
+
+@contextmanager
+def run_batch(conn: sqlite3.Connection, *, size: int = 1000) -> Iterator[RunBatch]:
+    """Collect runs across a block and write them in batched transactions.
+
+    Runs still buffered when the block raises are discarded; earlier flushes stay committed.
+    """
+    batch = RunBatch(conn, size=size)
+    yield batch
+    batch.flush()
+
+
+def _session_at(conn: sqlite3.Connection, started_at_us: int) -> Optional[int]:
+    row = conn.execute(
+        "SELECT id FROM sessions WHERE started_at_us <= ? AND (ended_at_us IS NULL OR ended_at_us > ?) "
+        "ORDER BY started_at_us DESC LIMIT 1;",
+        (started_at_us, started_at_us),
+    ).fetchone()
+    return int(row["id"]) if row is not None else None
+
+
+def drain_spool(conn: sqlite3.Connection, db_path: Path) -> int:
+    """Insert all spooled runs in a single transaction. Returns the row count."""
+    src = spool_path(db_path)
+    work = src.with_name(src.name + ".draining")
+    # Cheap unlocked check; a spool written just after it is drained next time.
+    if not work.exists() and not src.exists():
+        return 0
+
+    import json
+
+    params = []
+    try:
+        # The write lock is held from the rename to the unlink, so a concurrent drain
+        # waits here and then finds the work file gone instead of replaying it.
+        with write_transaction(conn):
+            # A leftover work file means a previous drain did not finish; replay it first.
+            if not work.exists():
+                try:
+                    with _spool_lock(db_path, exclusive=True):
+                        os.replace(src, work)
+                except OSError:
+                    # Gone already, or (on Windows) still open for append by a hook.
+                    return 0
+
+            with open(work, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        d = json.loads(line)
+                        # The spool keeps ISO strings so files from older versions still drain.
+                        started = to_us(from_iso(str(d["started_at_utc"])))
+                        params.append(
+                            (
+                                started,
+                                to_us(from_iso(str(d["finished_at_utc"]))),
+                                float(d["duration_s"]),
+                                int(d["exit_code"]),
+                                str(d["cwd"]),
+                                str(d["command"]),
+                                d.get("tag"),
+                                d.get("project"),
+                                d.get("category"),
+                                _session_at(conn, started),
+                            )
+                        )
+                    except (ValueError, KeyError, TypeError):
+                        # Skip torn or malformed lines rather than blocking every later drain
+                        continue
+
+            insert_runs_many(conn, params)
+            # Unlink before COMMIT so committed rows can never be replayed; a crash
+            # in between drops this batch instead of duplicating it.
+            work.unlink()
+    except OSError:
+        # The work file could not be read or removed; the rows were rolled back. Retry later.
+        return 0
+    return len(params)
+
+
+def _iso_sql(col: str) -> str:
+    """SQL rendering an epoch-microsecond column exactly as `to_iso(from_us(col))` would."""
+    return (
+        f"strftime('%Y-%m-%dT%H:%M:%S', {col} / 1000000, 'unixepoch')"
+        f" || CASE WHEN {col} % 1000000 THEN printf('.%06d', {col} % 1000000) ELSE '' END"
+        " || '+00:00'"
+    )
+
+
+# Column lists for run queries. _RUN_COLUMNS renders ISO-8601 timestamps in SQL (export
+# order); _RUN_RECORD_COLUMNS carries the integer timestamps used to build RunRecords.
+_RUN_COLUMNS = f"""
+    r.id, {_iso_sql("r.started_at_us")} AS started_at_utc, {_iso_sql("r.finished_at_us")} AS finished_at_utc,
+    r.duration_s, r.exit_code, r.cwd, r.command,
+    r.tag, r.project, r.category, r.session_id, s.name AS session_name
+"""
+_RUN_RECORD_COLUMNS = """
+    r.id, r.started_at_us, r.finished_at_us, r.duration_s, r.exit_code, r.cwd, r.command,
+    r.tag, r.project, r.category, r.session_id, s.name AS session_name
+"""
+
+
+@lru_cache(maxsize=64)
+def _runs_between_sql(columns: str, has_tag: bool, has_project: bool, has_category: bool, has_session: bool) -> str:
+    q = f"""
+        SELECT {columns}
         FROM runs r
         LEFT JOIN sessions s ON s.id = r.session_id
-        WHERE r.started_at_utc >= ? AND r.started_at_utc < ?
+        WHERE r.started_at_us >= ? AND r.started_at_us < ?
     """
-    params: list[object] = [to_iso(start_utc), to_iso(end_utc)]
+    if has_tag:
+        q += " AND r.tag = ?"
+    if has_project:
+        q += " AND r.project = ?"
+    if has_category:
+        q += " AND r.category = ?"
+    if has_session:
+        q += " AND r.session_id = ?"
+    return q + " ORDER BY r.started_at_us ASC LIMIT ?"
 
+
+def _runs_between_query(
+    *,
+    columns: str,
+    start_utc: datetime,
+    end_utc: datetime,
+    limit: int,
+    tag: Optional[str],
+    project: Optional[str],
+    category: Optional[str],
+    session_id: Optional[int],
+) -> tuple[str, list[object]]:
+    params: list[object] = [to_us(start_utc), to_us(end_utc)]
     if tag:
-        q += " AND r.tag = ?"
         params.append(tag)
     if project:
-        q += " AND r.project = ?"
         params.append(project)
     if category:
-        q += " AND r.category = ?"
         params.append(category)
     if session_id is not None:
-        q += " AND r.session_id = ?"
         params.append(int(session_id))
-
-    q += " ORDER BY r.started_at_utc ASC LIMIT ?"
     params.append(int(limit))
+    q = _runs_between_sql(columns, bool(tag), bool(project), bool(category), session_id is not None)
+    return q, params
+
+
+def _record_from_row(r: tuple) -> RunRecord:
+    # Positional: rows come from cursors with row_factory=None, in _RUN_RECORD_COLUMNS order.
+    rid, started_us, finished_us, duration_s, exit_code, cwd, command, tag, project, category, sid, sname = r
+    return RunRecord(
+        id=rid,
+        started_at_utc=from_us(started_us),
+        finished_at_utc=from_us(finished_us),
+        duration_s=duration_s,
+        exit_code=exit_code,
+        cwd=cwd,
+        command=command,
+        tag=tag,
+        project=project,
+        category=category,
+        session_id=sid,
+        session_name=sname,
+    )
 
-    rows = conn.execute(q, params).fetchall()
-    out: list[RunRecord] = []
-    for r in rows:
-        out.append(
-            RunRecord(
-                id=int(r["id"]),
-                started_at_utc=from_iso(r["started_at_utc"]),
-                finished_at_utc=from_iso(r["finished_at_utc"]),
-                duration_s=float(r["duration_s"]),
-                exit_code=int(r["exit_code"]),
-                cwd=str(r["cwd"]),
-                command=str(r["command"]),
-                tag=(str(r["tag"]) if r["tag"] is not None else None),
-                project=(str(r["project"]) if r["project"] is not None else None),
-                category=(str(r["category"]) if r["category"] is not None else None),
-                session_id=(int(r["session_id"]) if r["session_id"] is not None else None),
-                session_name=(str(r["session_name"]) if r["session_name"] is not None else None),
-            )
-        )
-    return out
 
+_FETCH_BATCH = 1000
 
-def fetch_recent_runs(conn: sqlite3.Connection, *, limit: int = 20) -> list[RunRecord]:
-    rows = conn.execute(
-        """
-        SELECT
-            r.id, r.started_at_utc, r.finished_at_utc, r.duration_s, r.exit_code, r.cwd, r.command,
-            r.tag, r.project, r.category, r.session_id, s.name AS session_name
-        FROM runs r
-        LEFT JOIN sessions s ON s.id = r.session_id
-        ORDER BY r.started_at_utc DESC
-        LIMIT ?;
-        """,
-        (int(limit),),
-    ).fetchall()
 
-    out: list[RunRecord] = []
-    for r in rows:
-        out.append(
-            RunRecord(
-                id=int(r["id"]),
-                started_at_utc=from_iso(r["started_at_utc"]),
-                finished_at_utc=from_iso(r["finished_at_utc"]),
-                duration_s=float(r["duration_s"]),
-                exit_code=int(r["exit_code"]),
-                cwd=str(r["cwd"]),
-                command=str(r["command"]),
-                tag=(str(r["tag"]) if r["tag"] is not None else None),
-                project=(str(r["project"]) if r["project"] is not None else None),
-                category=(str(r["category"]) if r["category"] is not None else None),
-                session_id=(int(r["session_id"]) if r["session_id"] is not None else None),
-                session_name=(str(r["session_name"]) if r["session_name"] is not None else None),
-            )
+def _tuple_cursor(conn: sqlite3.Connection) -> sqlite3.Cursor:
+    # Bulk reads skip sqlite3.Row: plain tuples, indexed or unpacked by position.
+    cur = conn.cursor()
+    cur.row_factory = None
+    return cur
+
+
+def _iter_rows_between(conn: sqlite3.Connection, *, columns: str, **filters) -> Iterator[tuple]:
+    q, params = _runs_between_query(columns=columns, **filters)
+    cur = _tuple_cursor(conn)
+    cur.execute(q, params)
+    while batch := cur.fetchmany(_FETCH_BATCH):
+        yield from batch
+
+
+def iter_run_rows_between(
+    conn: sqlite3.Connection,
+    *,
+    start_utc: datetime,
+    end_utc: datetime,
+    limit: int = 10000,
+    tag: Optional[str] = None,
+    project: Optional[str] = None,
+    category: Optional[str] = None,
+    session_id: Optional[int] = None,
+) -> Iterator[tuple]:
+    """Yield plain row tuples straight from the cursor, without building RunRecords.
+
+    Columns are in RunRecord field order; timestamps are ISO-8601 strings in UTC.
+    """
+    return _iter_rows_between(
+        conn,
+        columns=_RUN_COLUMNS,
+        start_utc=start_utc,
+        end_utc=end_utc,
+        limit=limit,
+        tag=tag,
+        project=project,
+        category=category,
+        session_id=session_id,
+    )
+
+
+# The run fields a report aggregates (report.ReportRow order); the grouped query
+# below selects them, plus started_at_us for ordering, as its window.
+_REPORT_COLUMNS = "r.duration_s, r.exit_code, r.cwd, r.command, r.project, r.category"
+
+
+# One row per distinct (command, project, cwd, category), in report.ReportGroup order.
+# Grouping on the bare columns (command first, the most selective) keeps the
+# GROUP BY sorter cheap; defaulting project/category is left to the few rows
+# that come back. Groups are ordered by their first run so that folding them into
+# dicts reproduces the key order a row-by-row pass would have seen.
+_REPORT_GROUP_SQL = """
+    SELECT
+        w.project,
+        w.cwd,
+        w.category,
+        w.command,
+        SUM(w.duration_s),
+        SUM(CASE WHEN w.exit_code = 0 THEN w.duration_s ELSE 0.0 END),
+        SUM(CASE WHEN w.exit_code != 0 THEN w.duration_s ELSE 0.0 END),
+        COUNT(*),
+        SUM(w.exit_code != 0)
+    FROM ({window}) w
+    GROUP BY w.command, w.project, w.cwd, w.category
+    ORDER BY MIN(w.started_at_us);
+"""
+
+
+def fetch_report_groups_between(
+    conn: sqlite3.Connection,
+    *,
+    start_utc: datetime,
+    end_utc: datetime,
+    limit: int = 10000,
+    tag: Optional[str] = None,
+    project: Optional[str] = None,
+    category: Optional[str] = None,
+    session_id: Optional[int] = None,
+) -> list[tuple]:
+    """Aggregate the window in SQL; returns O(distinct groups) tuples, not O(runs).
+
+    `limit` still caps the runs considered, exactly as for the row-level fetches.
+    """
+    window, params = _runs_between_query(
+        columns="r.started_at_us, " + _REPORT_COLUMNS,
+        start_utc=start_utc,
+        end_utc=end_utc,
+        limit=limit,
+        tag=tag,
+        project=project,
+        category=category,
+        session_id=session_id,
+    )
+    return _tuple_cursor(conn).execute(_REPORT_GROUP_SQL.format(window=window), params).fetchall()
+
+
+def iter_runs_between(
+    conn: sqlite3.Connection,
+    *,
+    start_utc: datetime,
+    end_utc: datetime,
+    limit: int = 10000,
+    tag: Optional[str] = None,
+    project: Optional[str] = None,
+    category: Optional[str] = None,
+    session_id: Optional[int] = None,
+) -> Iterator[RunRecord]:
+    """Yield RunRecords for the window, fetched from the cursor in batches."""
+    rows = _iter_rows_between(
+        conn,
+        columns=_RUN_RECORD_COLUMNS,
+        start_utc=start_utc,
+        end_utc=end_utc,
+        limit=limit,
+        tag=tag,
+        project=project,
+        category=category,
+        session_id=session_id,
+    )
+    return map(_record_from_row, rows)
+
+
+def fetch_runs_between(
+    conn: sqlite3.Connection,
+    *,
+    start_utc: datetime,
+    end_utc: datetime,
+    limit: int = 10000,
+    tag: Optional[str] = None,
+    project: Optional[str] = None,
+    category: Optional[str] = None,
+    session_id: Optional[int] = None,
+) -> list[RunRecord]:
+    return list(
+        iter_runs_between(
+            conn,
+            start_utc=start_utc,
+            end_utc=end_utc,
+            limit=limit,
+            tag=tag,
+            project=project,
+            category=category,
+            session_id=session_id,
         )
-    return out
+    )
+
+
+# Newest first by start time, id breaking ties: drained spool rows get ids after
+# runs recorded directly, so id order is not start-time order. idx_runs_started_us
+# (which carries the rowid) yields this order without a sort. Pages continue from
+# a (started_at_us, id) key; the redundant leading `<=` lets SQLite seek to it
+# instead of scanning every newer row. Two fixed statements rather than one with
+# `? IS NULL` branches, which would defeat the seek the same way.
+_RECENT_RUNS_SQL = f"""
+    SELECT {_RUN_RECORD_COLUMNS}
+    FROM runs r
+    LEFT JOIN sessions s ON s.id = r.session_id
+    ORDER BY r.started_at_us DESC, r.id DESC
+    LIMIT ?;
+"""
+_RECENT_RUNS_BEFORE_SQL = f"""
+    SELECT {_RUN_RECORD_COLUMNS}
+    FROM runs r
+    LEFT JOIN sessions s ON s.id = r.session_id
+    WHERE r.started_at_us <= ? AND (r.started_at_us < ? OR r.id < ?)
+    ORDER BY r.started_at_us DESC, r.id DESC
+    LIMIT ?;
+"""
+
+
+def iter_recent_run_rows(
+    conn: sqlite3.Connection, *, limit: int = 20, before_id: Optional[int] = None
+) -> Iterator[tuple]:
+    """Yield the most recent runs as tuples in `_RUN_RECORD_COLUMNS` order.
+
+    Timestamps are the integer `started_at_us`/`finished_at_us`. Newest first by
+    start time; pass the last id seen as `before_id` to fetch the next page.
+    """
+    if before_id is None:
+        yield from _tuple_cursor(conn).execute(_RECENT_RUNS_SQL, (int(limit),))
+        return
+    row = _tuple_cursor(conn).execute("SELECT started_at_us FROM runs WHERE id = ?;", (int(before_id),)).fetchone()
+    if row is None:
+        return
+    (started_us,) = row
+    yield from _tuple_cursor(conn).execute(
+        _RECENT_RUNS_BEFORE_SQL, (started_us, started_us, int(before_id), int(limit))
+    )
+
+
+def fetch_recent_runs(
+    conn: sqlite3.Connection, *, limit: int = 20, before_id: Optional[int] = None
+) -> list[RunRecord]:
+    return [_record_from_row(r) for r in iter_recent_run_rows(conn, limit=limit, before_id=before_id)]
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import heapq
+from collections import defaultdict
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Iterable
+from functools import lru_cache
+from operator import itemgetter
+from typing import Iterable, Optional
 
 from .models import RunRecord
 from .utils import format_duration
@@ -15,8 +19,8 @@ def local_day_bounds(now_local: datetime) -> tuple[datetime, datetime]:
 
 
 def to_utc(dt: datetime) -> datetime:
-    if dt.tzinfo is None:
-        dt = dt.astimezone()
+    # Naive values are read as system local time at that instant (DST-aware) by
+    # astimezone itself; no intermediate local-aware datetime is needed.
     return dt.astimezone(timezone.utc)
 
 
@@ -32,61 +36,145 @@ class Report:
     top_failed: list[tuple[str, float, int]]         # cmd, failed_s, failed_runs
 
 
-def _bar(value: float, max_value: float, width: int = 18) -> str:
+_BAR_WIDTH = 18
+# Every possible bar at the default width, indexed by filled cell count.
+_BARS = tuple("█" * i + " " * (_BAR_WIDTH - i) for i in range(_BAR_WIDTH + 1))
+
+
+def _bar(value: float, max_value: float, width: int = _BAR_WIDTH) -> str:
     if max_value <= 0:
         return ""
     filled = int(round((value / max_value) * width))
     filled = max(0, min(width, filled))
+    if width == _BAR_WIDTH:
+        return _BARS[filled]
     return "█" * filled + " " * (width - filled)
 
 
-def _project_key(r: RunRecord) -> str:
-    if r.project:
-        return r.project
-    p = r.cwd.rstrip("/\\")
+def _project_key(project: Optional[str], cwd: str) -> str:
+    if project:
+        return project
+    return _cwd_project(cwd)
+
+
+# A window has many runs but few distinct cwds, so split each path only once.
+# Both separators are handled (not os.path.basename) because the database may
+# hold Windows paths recorded by the PowerShell hook.
+@lru_cache(maxsize=1024)
+def _cwd_project(cwd: str) -> str:
+    p = cwd.rstrip("/\\")
     last = p.split("\\")[-1].split("/")[-1] if p else p
     return last or "unknown"
 
 
+# The only fields a report reads, in unpacking order:
+# (duration_s, exit_code, cwd, command, project, category)
+ReportRow = tuple[float, int, str, str, Optional[str], Optional[str]]
+
+
 def build_report(runs: Iterable[RunRecord], title: str) -> Report:
+    return build_report_from_rows(
+        ((r.duration_s, r.exit_code, r.cwd, r.command, r.project, r.category) for r in runs),
+        title,
+    )
+
+
+def build_report_from_rows(rows: Iterable[ReportRow], title: str) -> Report:
     total_s = 0.0
     success_s = 0.0
     failed_s = 0.0
 
-    proj: dict[str, float] = {}
-    cat: dict[str, float] = {}
-    cmd_total: dict[str, float] = {}
-    cmd_runs: dict[str, int] = {}
-    cmd_failed_runs: dict[str, int] = {}
-    cmd_failed_time: dict[str, float] = {}
-
-    for r in runs:
-        total_s += r.duration_s
-        if r.exit_code == 0:
-            success_s += r.duration_s
+    proj: defaultdict[str, float] = defaultdict(float)
+    cat: defaultdict[str, float] = defaultdict(float)
+    cmd_total: defaultdict[str, float] = defaultdict(float)
+    cmd_runs: defaultdict[str, int] = defaultdict(int)
+    cmd_failed_runs: defaultdict[str, int] = defaultdict(int)
+    cmd_failed_time: defaultdict[str, float] = defaultdict(float)
+
+    for duration_s, exit_code, cwd, command, project, category in rows:
+        total_s += duration_s
+        if exit_code == 0:
+            success_s += duration_s
         else:
-            failed_s += r.duration_s
-            cmd_failed_runs[r.command] = cmd_failed_runs.get(r.command, 0) + 1
-            cmd_failed_time[r.command] = cmd_failed_time.get(r.command, 0.0) + r.duration_s
+            failed_s += duration_s
+            cmd_failed_runs[command] += 1
+            cmd_failed_time[command] += duration_s
+
+        pk = _project_key(project, cwd)
+        proj[pk] += duration_s
 
-        pk = _project_key(r)
-        proj[pk] = proj.get(pk, 0.0) + r.duration_s
+        ck = category or "other"
+        cat[ck] += duration_s
+
+        cmd_total[command] += duration_s
+        cmd_runs[command] += 1
+
+    return _finish_report(
+        title, total_s, success_s, failed_s, proj, cat, cmd_total, cmd_runs, cmd_failed_runs, cmd_failed_time
+    )
 
-        ck = r.category or "other"
-        cat[ck] = cat.get(ck, 0.0) + r.duration_s
 
-        cmd_total[r.command] = cmd_total.get(r.command, 0.0) + r.duration_s
-        cmd_runs[r.command] = cmd_runs.get(r.command, 0) + 1
+# Pre-aggregated group from the database (see db.fetch_report_groups_between):
+# (project, cwd, category, command, total_s, success_s, failed_s, runs, failed_runs)
+ReportGroup = tuple[Optional[str], str, Optional[str], str, float, float, float, int, int]
+
+
+def build_report_from_groups(groups: Iterable[ReportGroup], title: str) -> Report:
+    total_s = 0.0
+    success_s = 0.0
+    failed_s = 0.0
+
+    proj: defaultdict[str, float] = defaultdict(float)
+    cat: defaultdict[str, float] = defaultdict(float)
+    cmd_total: defaultdict[str, float] = defaultdict(float)
+    cmd_runs: defaultdict[str, int] = defaultdict(int)
+    cmd_failed_runs: defaultdict[str, int] = defaultdict(int)
+    cmd_failed_time: defaultdict[str, float] = defaultdict(float)
+
+    for project, cwd, category, command, g_total, g_success, g_failed, g_runs, g_failed_runs in groups:
+        total_s += g_total
+        success_s += g_success
+        failed_s += g_failed
+        if g_failed_runs:
+            cmd_failed_runs[command] += g_failed_runs
+            cmd_failed_time[command] += g_failed
+
+        pk = _project_key(project, cwd)
+        proj[pk] += g_total
+
+        ck = category or "other"
+        cat[ck] += g_total
+
+        cmd_total[command] += g_total
+        cmd_runs[command] += g_runs
+
+    return _finish_report(
+        title, total_s, success_s, failed_s, proj, cat, cmd_total, cmd_runs, cmd_failed_runs, cmd_failed_time
+    )
 
-    by_project = sorted(proj.items(), key=lambda x: x[1], reverse=True)[:12]
-    by_category = sorted(cat.items(), key=lambda x: x[1], reverse=True)[:12]
 
-    top_cmds_sorted = sorted(cmd_total.items(), key=lambda x: x[1], reverse=True)[:12]
+def _finish_report(
+    title: str,
+    total_s: float,
+    success_s: float,
+    failed_s: float,
+    proj: dict[str, float],
+    cat: dict[str, float],
+    cmd_total: dict[str, float],
+    cmd_runs: dict[str, int],
+    cmd_failed_runs: dict[str, int],
+    cmd_failed_time: dict[str, float],
+) -> Report:
+    # Same result as sorted(..., reverse=True)[:n], ties included, without sorting everything.
+    by_project = heapq.nlargest(12, proj.items(), key=itemgetter(1))
+    by_category = heapq.nlargest(12, cat.items(), key=itemgetter(1))
+
+    top_cmds_sorted = heapq.nlargest(12, cmd_total.items(), key=itemgetter(1))
     top_commands: list[tuple[str, float, int, int]] = []
     for cmd, tot in top_cmds_sorted:
         top_commands.append((cmd, tot, cmd_runs.get(cmd, 0), cmd_failed_runs.get(cmd, 0)))
 
-    top_failed_sorted = sorted(cmd_failed_time.items(), key=lambda x: x[1], reverse=True)[:8]
+    top_failed_sorted = heapq.nlargest(8, cmd_failed_time.items(), key=itemgetter(1))
     top_failed: list[tuple[str, float, int]] = []
     for cmd, ftime in top_failed_sorted:
         top_failed.append((cmd, ftime, cmd_failed_runs.get(cmd, 0)))
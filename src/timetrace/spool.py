@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .utils import ensure_dir, default_data_dir, to_iso
+
+
+@dataclass(frozen=True)
+class DBPaths:
+    data_dir: Path
+    db_path: Path
+
+
+# The data dir is created once and the result reused; the CLI calls this from
+# several places (DB open, config lookup, spool path) per invocation.
+@lru_cache(maxsize=8)
+def resolve_db_path(explicit_path: Optional[str] = None) -> DBPaths:
+    if explicit_path:
+        p = Path(explicit_path).expanduser().resolve()
+        ensure_dir(p.parent)
+        return DBPaths(data_dir=p.parent, db_path=p)
+
+    data_dir = default_data_dir()
+    ensure_dir(data_dir)
+    db_path = data_dir / "timetrace.db"
+    return DBPaths(data_dir=data_dir, db_path=db_path)
+
+
+def spool_path(db_path: Path) -> Path:
+    return db_path.with_name(db_path.name + ".pending.jsonl")
+
+
+@contextmanager
+def _spool_lock(db_path: Path, *, exclusive: bool) -> Iterator[None]:
+    """Hold the spool's advisory lock: shared while appending, exclusive while swapping.
+
+    Without it a hook that opened the spool just before a drain renamed it could
+    append after the drainer read the file, and that line would be unlinked unread.
+    On Windows, os.replace already fails while any hook has the spool open.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(spool_path(db_path).with_suffix(".lock"), "a") as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+def spool_run(
+    db_path: Path,
+    *,
+    started_at_utc: datetime,
+    finished_at_utc: datetime,
+    duration_s: float,
+    exit_code: int,
+    cwd: str,
+    command: str,
+    tag: Optional[str],
+    project: Optional[str],
+    category: Optional[str],
+) -> None:
+    """Append a run to the pending spool instead of writing it to SQLite.
+
+    The session is resolved from the run's start time when the spool is drained.
+    """
+    import json
+
+    payload = {
+        "started_at_utc": to_iso(started_at_utc),
+        "finished_at_utc": to_iso(finished_at_utc),
+        "duration_s": float(duration_s),
+        "exit_code": int(exit_code),
+        "cwd": str(cwd),
+        "command": str(command),
+        "tag": tag,
+        "project": project,
+        "category": category,
+    }
+    # One short append per line; concurrent hooks do not interleave on POSIX.
+    with _spool_lock(db_path, exclusive=False), open(spool_path(db_path), "a", encoding="utf-8") as f:
+        f.write(json.dumps(payload) + "\n")
@@ -4,6 +4,8 @@ import os
 import re
 import shlex
 from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
 from typing import Iterable, Sequence
 
@@ -34,6 +36,15 @@ def default_data_dir() -> Path:
     return Path.home() / ".local" / "share" / DEFAULT_APP_DIRNAME
 
 
+def to_iso(dt: datetime) -> str:
+    tz = dt.tzinfo
+    if tz is timezone.utc:
+        return dt.isoformat()
+    if tz is None:
+        return dt.replace(tzinfo=timezone.utc).isoformat()
+    return dt.astimezone(timezone.utc).isoformat()
+
+
 def sys_platform() -> str:
     import platform
     return platform.system().lower()
@@ -43,6 +54,26 @@ def ensure_dir(p: Path) -> None:
     p.mkdir(parents=True, exist_ok=True)
 
 
+_SECRET_KEYS = frozenset({
+    "--password",
+    "--pass",
+    "--token",
+    "--apikey",
+    "--api-key",
+    "--secret",
+    "--client-secret",
+    "--access-token",
+    "--refresh-token",
+    "--bearer",
+})
+_SECRET_PREFIXES = tuple(k + "=" for k in _SECRET_KEYS)
+# Anything the per-argument rules in _redact_args could redact contains one of these, so
+# one search over the joined argv lets clean commands skip the loop entirely.
+_MAYBE_SECRET_RE = re.compile(
+    "|".join(re.escape(k) for k in _SECRET_KEYS) + r"|[A-Za-z0-9_\-]{40,}"
+)
+
+
 def sanitize_command(argv: Sequence[str], max_len: int = 300) -> str:
     """Sanitize command arguments to reduce risk of storing secrets.
 
@@ -51,22 +82,20 @@ def sanitize_command(argv: Sequence[str], max_len: int = 300) -> str:
     - If argument is a flag that implies the next arg is secret, redact next
     - Redact long base64-like blobs
     """
-    secret_keys = {
-        "--password",
-        "--pass",
-        "--token",
-        "--apikey",
-        "--api-key",
-        "--secret",
-        "--client-secret",
-        "--access-token",
-        "--refresh-token",
-        "--bearer",
-    }
-    secret_prefixes = tuple(k + "=" for k in secret_keys)
+    if _MAYBE_SECRET_RE.search("\0".join(argv)):
+        argv = _redact_args(argv)
+
+    s = " ".join(shlex.quote(x) for x in argv)
+    if len(s) > max_len:
+        return s[: max_len - 3] + "..."
+    return s
+
+
+def _redact_args(argv: Sequence[str]) -> list[str]:
+    secret_keys = _SECRET_KEYS
+    secret_prefixes = _SECRET_PREFIXES
 
     redacted: list[str] = []
-    it = iter(range(len(argv)))
     i = 0
     while i < len(argv):
         a = argv[i]
@@ -92,30 +121,25 @@ def sanitize_command(argv: Sequence[str], max_len: int = 300) -> str:
 
         redacted.append(a)
         i += 1
-
-    s = " ".join(shlex.quote(x) for x in redacted)
-    if len(s) > max_len:
-        return s[: max_len - 3] + "..."
-    return s
+    return redacted
 
 
-_BLOB_RE = re.compile(r"^[A-Za-z0-9_\-]{40,}$")
+# Token-ish: 40+ URL-safe base64 characters including at least one digit and one
+# letter. The lookaheads do both checks inside the same regex walk.
+_BLOB_RE = re.compile(r"^(?=[A-Za-z0-9_\-]*[0-9])(?=[A-Za-z0-9_\-]*[A-Za-z])[A-Za-z0-9_\-]{40,}$")
 
 
 def _looks_like_secret_blob(s: str) -> bool:
-    if len(s) < 40:
-        return False
-    if _BLOB_RE.match(s) is None:
-        return False
-    # if it has at least one digit and one letter, more likely a token
-    has_digit = any(c.isdigit() for c in s)
-    has_alpha = any(c.isalpha() for c in s)
-    return has_digit and has_alpha
+    return len(s) >= 40 and _BLOB_RE.match(s) is not None
 
 
 def format_duration(seconds: float) -> str:
-    seconds = max(0.0, float(seconds))
-    total = int(round(seconds))
+    return _format_whole_seconds(int(round(max(0.0, float(seconds)))))
+
+
+# Reports format the same few rounded values over and over (0s, 1s, ...).
+@lru_cache(maxsize=4096)
+def _format_whole_seconds(total: int) -> str:
     h = total // 3600
     m = (total % 3600) // 60
     s = total % 60
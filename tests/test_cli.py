@@ -0,0 +1,177 @@
+import contextlib
+import io
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from timetrace.cli import main, _fast_record_args, _fast_run_args, _parse_dt, _parser, _sniff_subcommand, _split_run_command
+
+def test_fast_record_args_matches_argparse():
+    argv = [
+        "--started", "2024-01-01T10:00:00+00:00",
+        "--finished", "2024-01-01T10:00:05+00:00",
+        "--exit", "1",
+        "--cwd", "/tmp",
+        "--command", "pytest -q",
+        "--tag", "course",
+    ]
+    fast = _fast_record_args(argv)
+    full = _parser().parse_args(["record"] + argv)
+    assert fast is not None
+    assert vars(fast) == vars(full)
+
+def test_fast_record_args_falls_back():
+    assert _fast_record_args(["--started", "x"]) is None
+    assert _fast_record_args(["--bogus", "1"]) is None
+
+def test_parse_dt_normalizes_to_utc():
+    expected = datetime(2024, 1, 1, 10, 0, tzinfo=timezone.utc)
+    assert _parse_dt("2024-01-01T10:00:00Z") == expected
+    assert _parse_dt("2024-01-01T12:00:00+02:00") == expected
+    assert _parse_dt("2024-01-01T12:00:00+02:00").tzinfo is timezone.utc
+
+@pytest.mark.skipif(not hasattr(time, "tzset"), reason="needs time.tzset")
+def test_parse_dt_naive_uses_offset_at_that_instant(monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    try:
+        assert _parse_dt("2024-01-15T12:00:00") == datetime(2024, 1, 15, 17, 0, tzinfo=timezone.utc)
+        assert _parse_dt("2024-07-15T12:00:00") == datetime(2024, 7, 15, 16, 0, tzinfo=timezone.utc)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+def test_fast_run_args_matches_argparse():
+    head = ["--tag", "t", "--cwd", "/tmp"]
+    cmd = ["npm", "run", "build", "--", "--watch"]
+    fast = _fast_run_args(head + ["--"] + cmd)
+    args = _parser("run").parse_args(["run"] + head)
+    args.command = cmd
+    assert vars(fast) == vars(args)
+    assert _fast_run_args(["--tag", "t"]) is None
+    assert _fast_run_args(["--tag", "--"]) is None
+    assert _fast_run_args(["--tag=t", "--", "ls"]) is None
+
+def test_split_run_command():
+    argv = ["--db", "x.db", "run", "--tag", "t", "--", "npm", "run", "build", "--", "--watch"]
+    head, cmd = _split_run_command(argv)
+    assert head == ["--db", "x.db", "run", "--tag", "t"]
+    assert cmd == ["npm", "run", "build", "--", "--watch"]
+    assert _split_run_command(["list", "--", "x"]) == (["list", "--", "x"], [])
+
+def test_parser_builds_only_sniffed_subcommand():
+    assert _sniff_subcommand(["--db", "x.db", "list", "--limit", "5"]) == "list"
+    assert _sniff_subcommand(["--help"]) is None
+    args = _parser("list").parse_args(["--db", "x.db", "list", "--limit", "5"])
+    assert (args.cmd, args.limit, args.db) == ("list", 5, "x.db")
+    sub = _parser("list")._subparsers._group_actions[0]
+    assert list(sub.choices) == ["list"]
+
+def test_read_commands_do_not_create_db(tmp_path, capsys):
+    db = tmp_path / "t.db"
+    assert main(["--db", str(db), "list"]) == 0
+    assert main(["--db", str(db), "report", "--today"]) == 0
+    assert capsys.readouterr().out == "No runs recorded yet.\n" * 2
+    assert not db.exists()
+
+def _record_runs(db):
+    started = datetime.now(timezone.utc).replace(microsecond=250000) - timedelta(hours=1)
+    finished = started + timedelta(seconds=2)
+    base = ["--db", str(db), "record", "--started", started.isoformat(), "--finished", finished.isoformat()]
+    assert main(base + ["--exit", "0", "--cwd", "/tmp/proj", "--command", "make all", "--tag", "t1"]) == 0
+    assert main(base + ["--exit", "3", "--cwd", "/tmp/proj", "--command", "pytest -q"]) == 0
+    return started, finished
+
+def test_export_json_to_text_stdout(tmp_path):
+    db = tmp_path / "t.db"
+    _record_runs(db)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        assert main(["--db", str(db), "export", "--last", "2", "--format", "json"]) == 0
+    assert [r["command"] for r in json.loads(out.getvalue())] == ["make all", "pytest -q"]
+
+def test_export_csv_and_json_fields(tmp_path):
+    import csv
+
+    db = tmp_path / "t.db"
+    started, finished = _record_runs(db)
+    fields = [
+        "id", "started_at", "finished_at", "duration_s", "exit_code", "cwd",
+        "command", "tag", "project", "category", "session_id", "session_name",
+    ]
+
+    csv_path = tmp_path / "out.csv"
+    assert main(["--db", str(db), "export", "--last", "2", "--format", "csv", "--out", str(csv_path)]) == 0
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        header, first, second = list(csv.reader(f))
+    assert header == fields
+    assert first == [
+        "1", started.isoformat(), finished.isoformat(), "2.0", "0", "/tmp/proj",
+        "make all", "t1", "", "other", "", "",
+    ]
+    assert second[6:8] == ["pytest -q", ""] and second[4] == "3"
+    assert started.isoformat().endswith(".250000+00:00")
+
+    json_path = tmp_path / "out.json"
+    assert main(["--db", str(db), "export", "--last", "2", "--format", "json", "--out", str(json_path)]) == 0
+    first, second = json.loads(json_path.read_text(encoding="utf-8"))
+    assert list(first) == fields
+    assert first["started_at"] == started.isoformat()
+    assert first["finished_at"] == finished.isoformat()
+    assert (first["id"], first["duration_s"], first["exit_code"]) == (1, 2.0, 0)
+    assert first["project"] is None and first["session_id"] is None and first["session_name"] is None
+    assert second["tag"] is None and second["category"] == "testing"
+
+def test_run_drains_spool_after_the_command(tmp_path, capsys):
+    import sys
+
+    from timetrace.db import connect, fetch_recent_runs, spool_path
+
+    db = tmp_path / "t.db"
+    started = datetime.now(timezone.utc) - timedelta(minutes=5)
+    assert main([
+        "--db", str(db), "record", "--defer", "--started", started.isoformat(),
+        "--finished", (started + timedelta(seconds=1)).isoformat(),
+        "--exit", "0", "--cwd", "/tmp", "--command", "make all",
+    ]) == 0
+    spool = spool_path(db)
+    assert spool.exists()
+
+    # The child exits 0 only if the spool is still pending while it runs.
+    probe = f"import os, sys; sys.exit(0 if os.path.exists({str(spool)!r}) else 5)"
+    assert main(["--db", str(db), "run", "--", sys.executable, "-c", probe]) == 0
+    assert not spool.exists()
+    assert [r.command for r in fetch_recent_runs(connect(db), limit=5)][1] == "make all"
+
+def test_deferred_record_does_not_import_sqlite3(tmp_path):
+    import subprocess
+    import sys
+
+    db = tmp_path / "t.db"
+    code = (
+        "import sys; from timetrace.cli import main; "
+        f"rc = main(['--db', {str(db)!r}, 'record', '--defer', '--started', '2024-01-01T00:00:00+00:00', "
+        "'--finished', '2024-01-01T00:00:01+00:00', '--exit', '0', '--cwd', '/tmp', '--command', 'make all']); "
+        "sys.exit(rc or ('sqlite3' in sys.modules and 7))"
+    )
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
+    assert not db.exists()
+
+def test_json_fallback_matches_orjson(monkeypatch):
+    import builtins
+
+    from timetrace.cli import _json_encoder
+
+    orjson = pytest.importorskip("orjson")
+    row = {"id": 7, "duration_s": 0.001021, "cwd": "/tmp/café", "command": 'echo "x\ty"', "tag": None}
+    real_import = builtins.__import__
+
+    def no_orjson(name, *a, **kw):
+        if name == "orjson":
+            raise ImportError(name)
+        return real_import(name, *a, **kw)
+
+    monkeypatch.setattr(builtins, "__import__", no_orjson)
+    assert _json_encoder()(row) == orjson.dumps(row)
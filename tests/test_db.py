@@ -0,0 +1,393 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from timetrace.db import (
+    SCHEMA_VERSION,
+    connect,
+    init_db,
+    create_session,
+    end_session,
+    spool_run,
+    spool_path,
+    drain_spool,
+    fetch_recent_runs,
+    fetch_session_by_id,
+    fetch_runs_between,
+    iter_runs_between,
+    insert_runs_many,
+    run_batch,
+    write_transaction,
+    get_active_session_id,
+    set_active_session_id,
+    to_us,
+    _runs_between_query,
+    _RUN_COLUMNS,
+    _RECENT_RUNS_BEFORE_SQL,
+)
+
+def _spool(db_path, started, command):
+    spool_run(
+        db_path,
+        started_at_utc=started,
+        finished_at_utc=started + timedelta(seconds=2),
+        duration_s=2.0,
+        exit_code=0,
+        cwd="/tmp",
+        command=command,
+        tag=None,
+        project=None,
+        category="other",
+    )
+
+def test_drain_spool_assigns_sessions_by_start_time(tmp_path):
+    db_path = tmp_path / "t.db"
+    conn = connect(db_path)
+    init_db(conn)
+    t0 = datetime(2024, 1, 1, 10, 0, tzinfo=timezone.utc)
+    sid = create_session(conn, name="focus", started_at_utc=t0)
+    end_session(conn, session_id=sid, ended_at_utc=t0 + timedelta(hours=1))
+
+    _spool(db_path, t0 + timedelta(minutes=5), "inside")
+    _spool(db_path, t0 + timedelta(hours=2), "outside")
+    with open(spool_path(db_path), "a", encoding="utf-8") as f:
+        f.write("{torn\n")
+
+    assert drain_spool(conn, db_path) == 2
+    assert not spool_path(db_path).exists()
+    assert drain_spool(conn, db_path) == 0
+
+    runs = {r.command: r for r in fetch_recent_runs(conn, limit=10)}
+    assert runs["inside"].session_id == sid
+    assert runs["outside"].session_id is None
+
+def test_concurrent_drain_does_not_replay_work_file(tmp_path, monkeypatch):
+    import sqlite3
+
+    import timetrace.db as db
+
+    db_path = tmp_path / "t.db"
+    conn = connect(db_path)
+    init_db(conn)
+    t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for i in range(3):
+        _spool(db_path, t0 + timedelta(minutes=i), f"c{i}")
+
+    other = connect(db_path)
+    other.execute("PRAGMA busy_timeout = 0;")
+    real_session_at = db._session_at
+    blocked = []
+
+    def session_at(c, started_us):
+        # Mid-drain, with the work file renamed: a second drainer must not get in.
+        if not blocked:
+            try:
+                drain_spool(other, db_path)
+            except sqlite3.OperationalError as e:
+                blocked.append(str(e))
+        return real_session_at(c, started_us)
+
+    monkeypatch.setattr(db, "_session_at", session_at)
+    assert drain_spool(conn, db_path) == 3
+    assert blocked and "locked" in blocked[0]
+    monkeypatch.setattr(db, "_session_at", real_session_at)
+    assert drain_spool(other, db_path) == 0
+    assert sorted(r.command for r in fetch_recent_runs(conn, limit=10)) == ["c0", "c1", "c2"]
+
+@pytest.mark.skipif(os.name == "nt", reason="POSIX advisory locks")
+def test_drain_waits_for_in_flight_spool_append(tmp_path):
+    import threading
+    import time
+
+    from timetrace.spool import _spool_lock
+
+    db_path = tmp_path / "t.db"
+    init_db(connect(db_path))
+    t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    _spool(db_path, t0, "early")
+
+    drained = []
+    with _spool_lock(db_path, exclusive=False), open(spool_path(db_path), "a", encoding="utf-8"):
+        # A hook has the spool open; the drain must not swap it out from under it.
+        worker = threading.Thread(target=lambda: drained.append(drain_spool(connect(db_path), db_path)))
+        worker.start()
+        time.sleep(0.2)
+        assert worker.is_alive()
+        _spool(db_path, t0 + timedelta(seconds=1), "late")
+    worker.join(5)
+
+    assert drained == [2]
+    conn = connect(db_path)
+    assert sorted(r.command for r in fetch_recent_runs(conn, limit=10)) == ["early", "late"]
+
+def test_init_db_backfills_epoch_us_on_upgrade(tmp_path):
+    db_path = tmp_path / "old.db"
+    conn = connect(db_path)
+    # v1 layout: no project/category/session_id or integer timestamp columns
+    conn.executescript(
+        """
+        CREATE TABLE runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at_utc TEXT NOT NULL,
+            finished_at_utc TEXT NOT NULL,
+            duration_s REAL NOT NULL,
+            exit_code INTEGER NOT NULL,
+            cwd TEXT NOT NULL,
+            command TEXT NOT NULL,
+            tag TEXT
+        );
+        INSERT INTO runs(started_at_utc, finished_at_utc, duration_s, exit_code, cwd, command)
+        VALUES('2024-01-01T10:00:00.123456+00:00', '2024-01-01T10:00:02.5+00:00', 2.4, 0, '/tmp', 'make');
+        """
+    )
+    init_db(conn)
+
+    (run,) = fetch_runs_between(
+        conn,
+        start_utc=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        end_utc=datetime(2024, 1, 2, tzinfo=timezone.utc),
+    )
+    assert run.started_at_utc == datetime(2024, 1, 1, 10, 0, 0, 123456, tzinfo=timezone.utc)
+    assert run.finished_at_utc == datetime(2024, 1, 1, 10, 0, 2, 500000, tzinfo=timezone.utc)
+
+def test_init_db_rebuilds_text_timestamp_sessions(tmp_path):
+    conn = connect(tmp_path / "old.db")
+    conn.executescript(
+        """
+        CREATE TABLE sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            started_at_utc TEXT NOT NULL,
+            ended_at_utc TEXT
+        );
+        INSERT INTO sessions(name, started_at_utc) VALUES('focus', '2024-01-01T10:00:00.5+00:00');
+        """
+    )
+    init_db(conn)
+
+    cols = {r["name"] for r in conn.execute("PRAGMA table_info(sessions);")}
+    assert cols == {"id", "name", "started_at_us", "ended_at_us"}
+    sess = fetch_session_by_id(conn, 1)
+    assert sess["started_at_utc"] == "2024-01-01T10:00:00.500000+00:00"
+    assert sess["ended_at_utc"] is None
+
+def test_init_db_rechecks_legacy_schema_under_lock(tmp_path, monkeypatch):
+    from contextlib import contextmanager
+
+    import timetrace.db as db
+
+    db_path = tmp_path / "old.db"
+    first = connect(db_path)
+    first.executescript(
+        """
+        CREATE TABLE sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            started_at_utc TEXT NOT NULL,
+            ended_at_utc TEXT
+        );
+        INSERT INTO sessions(name, started_at_utc) VALUES('focus', '2024-01-01T10:00:00+00:00');
+        """
+    )
+    second = connect(db_path)
+    real_transaction = db.write_transaction
+    raced = []
+
+    @contextmanager
+    def racing_transaction(conn):
+        # The other process migrates after `second` looked at the schema unlocked.
+        if conn is second and not raced:
+            raced.append(True)
+            init_db(first)
+        with real_transaction(conn):
+            yield conn
+
+    monkeypatch.setattr(db, "write_transaction", racing_transaction)
+    init_db(second)
+    assert raced
+    assert fetch_session_by_id(second, 1)["name"] == "focus"
+    assert second.execute("PRAGMA foreign_keys;").fetchone()[0] == 1
+
+def test_filtered_window_uses_composite_index(tmp_path):
+    conn = connect(tmp_path / "t.db")
+    init_db(conn)
+    now = datetime.now(timezone.utc)
+    q, params = _runs_between_query(
+        columns=_RUN_COLUMNS,
+        start_utc=now - timedelta(days=1),
+        end_utc=now,
+        limit=10,
+        tag=None,
+        project="proj",
+        category=None,
+        session_id=None,
+    )
+    plan = " ".join(r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + q, params))
+    assert "idx_runs_project_started" in plan
+    assert "TEMP B-TREE" not in plan
+
+    q, params = _runs_between_query(
+        columns=_RUN_COLUMNS,
+        start_utc=now - timedelta(days=1),
+        end_utc=now,
+        limit=10,
+        tag=None,
+        project=None,
+        category=None,
+        session_id=3,
+    )
+    plan = " ".join(r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + q, params))
+    assert "idx_runs_session_started" in plan
+    assert "TEMP B-TREE" not in plan
+
+def test_filter_indexes_are_partial(tmp_path):
+    conn = connect(tmp_path / "t.db")
+    init_db(conn)
+    sql = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type='index' AND name LIKE 'idx_runs_%';"))
+    assert sql["idx_runs_tag_started"].endswith("WHERE tag IS NOT NULL")
+    assert sql["idx_runs_project_started"].endswith("WHERE project IS NOT NULL")
+    assert sql["idx_runs_category_started"].endswith("WHERE category IS NOT NULL")
+
+    now = datetime.now(timezone.utc)
+    q, params = _runs_between_query(
+        columns=_RUN_COLUMNS,
+        start_utc=now - timedelta(days=1),
+        end_utc=now,
+        limit=10,
+        tag=None,
+        project=None,
+        category="testing",
+        session_id=None,
+    )
+    plan = " ".join(r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + q, params))
+    assert "idx_runs_category_started" in plan
+    assert "TEMP B-TREE" not in plan
+
+def test_recent_runs_page_by_start_time(tmp_path):
+    conn = connect(tmp_path / "t.db")
+    init_db(conn)
+    t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    # Inserted out of start order (as a spool drain does); cmd 2 and cmd 3 tie.
+    offsets = {"cmd 4": 40, "cmd 0": 0, "cmd 3": 20, "cmd 2": 20, "cmd 1": 10}
+    insert_runs_many(
+        conn,
+        [
+            (to_us(t0) + off, to_us(t0) + off + 1, 1.0, 0, "/tmp", cmd, None, None, "other", None)
+            for cmd, off in offsets.items()
+        ],
+    )
+
+    plan = " ".join(r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + _RECENT_RUNS_BEFORE_SQL, (1, 1, 3, 10)))
+    assert "SEARCH r USING INDEX idx_runs_started_us" in plan
+    assert "TEMP B-TREE" not in plan
+    assert [r.command for r in fetch_recent_runs(conn, limit=10)] == ["cmd 4", "cmd 2", "cmd 3", "cmd 1", "cmd 0"]
+    page = fetch_recent_runs(conn, limit=2)
+    assert [r.command for r in page] == ["cmd 4", "cmd 2"]
+    nxt = fetch_recent_runs(conn, limit=2, before_id=page[-1].id)
+    assert [r.command for r in nxt] == ["cmd 3", "cmd 1"]
+    assert fetch_recent_runs(conn, limit=2, before_id=999) == []
+
+def test_init_db_is_noop_when_schema_current(tmp_path):
+    db_path = tmp_path / "t.db"
+    conn = connect(db_path)
+    init_db(conn)
+    conn.close()
+
+    conn = connect(db_path)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    init_db(conn)
+    assert len(statements) == 1 and "schema_version" in statements[0]
+
+def test_init_db_creates_schema_in_one_transaction(tmp_path):
+    conn = connect(tmp_path / "t.db")
+    statements = []
+    conn.set_trace_callback(statements.append)
+    init_db(conn)
+    assert [s for s in statements if s.startswith(("BEGIN", "COMMIT"))] == ["BEGIN IMMEDIATE;", "COMMIT;"]
+    assert conn.execute("SELECT value FROM meta WHERE key='schema_version';").fetchone()[0] == str(SCHEMA_VERSION)
+
+def test_iter_runs_between_spans_fetch_batches(tmp_path):
+    conn = connect(tmp_path / "t.db")
+    init_db(conn)
+    t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(7000):
+        st = t0 + timedelta(seconds=i)
+        fi = st + timedelta(seconds=1)
+        rows.append((to_us(st), to_us(fi), 1.0, 0, "/tmp", f"cmd {i}", None, None, "other", None))
+    assert insert_runs_many(conn, rows) == 7000
+
+    window = dict(start_utc=t0, end_utc=t0 + timedelta(days=1), limit=10000)
+    runs = list(iter_runs_between(conn, **window))
+    assert len(runs) == 7000
+    assert runs[0].command == "cmd 0" and runs[-1].command == "cmd 6999"
+    assert runs == fetch_runs_between(conn, **window)
+
+def test_run_batch_flushes_in_chunks(tmp_path):
+    conn = connect(tmp_path / "t.db")
+    init_db(conn)
+    t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with run_batch(conn, size=2) as batch:
+        for i in range(5):
+            batch.add(
+                started_at_utc=t0 + timedelta(seconds=i),
+                finished_at_utc=t0 + timedelta(seconds=i + 1),
+                duration_s=1.0,
+                exit_code=0,
+                cwd="/tmp",
+                command=f"cmd {i}",
+                tag=None,
+                project=None,
+                category="other",
+                session_id=None,
+            )
+        assert batch.count == 4
+    assert batch.count == 5
+    assert [r.command for r in fetch_recent_runs(conn, limit=10)] == [f"cmd {i}" for i in range(4, -1, -1)]
+
+def test_report_groups_match_row_fold(tmp_path):
+    from timetrace.db import fetch_report_groups_between
+    from timetrace.report import build_report, build_report_from_groups
+
+    conn = connect(tmp_path / "t.db")
+    init_db(conn)
+    t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    specs = [
+        ("make", 4.0, 0, "/w/api", None, "build"),
+        ("pytest", 2.0, 1, "/w/api/", "", "testing"),
+        ("make", 1.0, 2, "/x/api", "api", None),
+        ("ls", 0.5, 0, "C:\\w\\web", None, ""),
+        ("pytest", 3.0, 0, "/w/web", "web", "testing"),
+    ]
+    rows = []
+    for i, (cmd, dur, rc, cwd, proj, cat) in enumerate(specs):
+        st = to_us(t0 + timedelta(minutes=i))
+        rows.append((st, st + int(dur * 1e6), dur, rc, cwd, cmd, None, proj, cat, None))
+    insert_runs_many(conn, rows)
+
+    for limit in (10, 3):
+        window = dict(start_utc=t0, end_utc=t0 + timedelta(days=1), limit=limit)
+        expected = build_report(fetch_runs_between(conn, **window), title="t")
+        assert build_report_from_groups(fetch_report_groups_between(conn, **window), title="t") == expected
+
+
+def test_write_transaction_nests_and_rolls_back(tmp_path):
+    conn = connect(tmp_path / "t.db")
+    init_db(conn)
+    t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    row = (to_us(t0), to_us(t0) + 1_000_000, 1.0, 0, "/tmp", "make", None, None, "build", None)
+    try:
+        with write_transaction(conn):
+            sid = create_session(conn, name="s", started_at_utc=t0)
+            set_active_session_id(conn, sid)
+            insert_runs_many(conn, [row])
+            assert conn.in_transaction
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert not conn.in_transaction
+    assert get_active_session_id(conn) is None
+    assert fetch_session_by_id(conn, sid) is None
+    assert fetch_recent_runs(conn, limit=10) == []
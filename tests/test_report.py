@@ -0,0 +1,39 @@
+from datetime import datetime, timezone
+
+from timetrace.models import RunRecord
+from timetrace.report import build_report, build_report_from_rows
+
+
+def _run(command, duration_s, exit_code=0, cwd="/home/me/proj", project=None, category="build"):
+    t = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return RunRecord(
+        id=1,
+        started_at_utc=t,
+        finished_at_utc=t,
+        duration_s=duration_s,
+        exit_code=exit_code,
+        cwd=cwd,
+        command=command,
+        tag=None,
+        project=project,
+        category=category,
+        session_id=None,
+        session_name=None,
+    )
+
+def test_build_report_matches_tuple_rows():
+    runs = [
+        _run("make", 10.0),
+        _run("make", 5.0, exit_code=2),
+        _run("pytest", 3.0, cwd="C:\\work\\api\\", category="testing"),
+        _run("ls", 1.0, project="docs", category=None),
+    ]
+    rep = build_report(runs, title="t")
+    rows = [(r.duration_s, r.exit_code, r.cwd, r.command, r.project, r.category) for r in runs]
+    assert build_report_from_rows(rows, title="t") == rep
+
+    assert rep.total_s == 19.0 and rep.failed_s == 5.0
+    assert rep.by_project == [("proj", 15.0), ("api", 3.0), ("docs", 1.0)]
+    assert rep.by_category == [("build", 15.0), ("testing", 3.0), ("other", 1.0)]
+    assert rep.top_commands[0] == ("make", 15.0, 2, 1)
+    assert rep.top_failed == [("make", 5.0, 1)]
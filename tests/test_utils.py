@@ -1,6 +1,6 @@
 from timetrace.utils import sanitize_command, format_duration
 from timetrace.categorize import categorize
-from timetrace.config import TTConfig
+from timetrace.config import TTConfig, is_ignored, load_ignore_rules, save_config
 
 def test_format_duration():
     assert format_duration(0) == "0s"
@@ -12,14 +12,65 @@ def test_sanitize_command_redacts():
     s = sanitize_command(["curl", "--token=abc1234567890abcdefghijklmnopqrstuvwxyzABCDE", "https://x"])
     assert "<redacted>" in s
 
+def test_sanitize_command_clean_and_flag_forms():
+    assert sanitize_command(["git", "commit", "-m", "fix it"]) == "git commit -m 'fix it'"
+    assert sanitize_command(["x", "--password", "hunter2"]) == "x --password '<redacted>'"
+    # 40+ letters with no digit is not token-ish
+    assert sanitize_command(["echo", "a" * 45]) == "echo " + "a" * 45
+
 def test_categorize():
     assert categorize("git status") == "git"
     assert categorize("pytest -q") == "testing"
     assert categorize("npm test") == "testing"
     assert categorize("npm run build") == "build"
+    assert categorize("npm run test:unit") == "testing"
+    assert categorize("yarn test:e2e") == "testing"
+    assert categorize("npm run build:prod") == "build"
+    assert categorize("pnpm lint:fix") == "lint"
+    assert categorize("npm install") == "node"
+
+def test_categorize_keywords_match_as_substrings():
+    for cmd in ("python -m pytest", "poetry run pytest -q", "uv run pytest", "python -m unittest",
+                "./run_tests.sh", "make test-unit", "gradle :app:test"):
+        assert categorize(cmd) == "testing", cmd
+    assert categorize("make check-format") == "lint"
+    assert categorize("make build-all") == "build"
+    assert categorize("python setup.py build_ext") == "build"
+    assert categorize("Git status") == "other"
 
 def test_ignore_prefix():
     cfg = TTConfig()
     assert cfg.should_ignore("cd ..")
     assert cfg.should_ignore("dir")
-    assert not cfg.should_ignore("python -c "print(1)"")
+    assert not cfg.should_ignore('python -c "print(1)"')
+
+def test_ignore_rules_follow_mutated_config():
+    cfg = TTConfig()
+    assert not cfg.should_ignore("foo bar")
+    cfg.ignore_regex = ["^foo"]
+    assert cfg.should_ignore("foo bar")
+    cfg.ignore_prefixes.append("make")
+    assert cfg.should_ignore("make all")
+    cfg.ignore_prefixes.remove("cd")
+    assert not cfg.should_ignore("cd ..")
+
+def test_ignore_regex_skips_invalid_patterns():
+    cfg = TTConfig(ignore_regex=["(", r"^make\s+clean"])
+    assert cfg.should_ignore("make clean")
+    assert not cfg.should_ignore("make all")
+
+def test_load_ignore_rules_matches_config(tmp_path):
+    db = str(tmp_path / "t.db")
+    assert is_ignored("cd ..", *load_ignore_rules(db))
+    save_config(TTConfig(ignore_prefixes=["make"], ignore_regex=[r"--dry-run"]), db)
+    prefixes, patterns = load_ignore_rules(db)
+    assert is_ignored("make all", prefixes, patterns)
+    assert is_ignored("git push --dry-run", prefixes, patterns)
+    assert not is_ignored("cd ..", prefixes, patterns)
+
+def test_ignore_regex_fused_matches_each_pattern():
+    cfg = TTConfig(ignore_regex=[r"^make\s+clean", r"--dry-run$", r"(a)\1"])
+    assert cfg.should_ignore("make clean")
+    assert cfg.should_ignore("git push --dry-run")
+    assert cfg.should_ignore("echo aa")
+    assert not cfg.should_ignore("git push")